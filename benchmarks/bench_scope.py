@@ -0,0 +1,111 @@
+"""
+クロール範囲判定のベンチマーク。
+ScopeFilter と、以前の LinkChecker._is_allowed（URL ごとの urlparse と
+パターンの線形走査）を同じURL列で比較し、判定結果が一致することも確認する。
+
+    python -m benchmarks.bench_scope [--urls N] [--patterns N] [--repeat N]
+"""
+import argparse
+import random
+import time
+from urllib.parse import urlparse
+
+from href_hound.scope import ScopeFilter
+
+START_URL = "https://example.com/docs/"
+
+
+class LegacyFilter:
+    """
+    以前の LinkChecker._is_allowed と同じ判定。
+    """
+    def __init__(self, start_url: str, same_origin: bool, include_subdomains: bool,
+                 exclude: list[str], include: list[str]):
+        parsed = urlparse(start_url)
+        self.start_host = parsed.netloc
+        prefix = parsed.path
+        if not prefix.endswith("/"):
+            prefix += "/"
+        self.start_prefix = prefix
+        self.same_origin = same_origin
+        self.include_subdomains = include_subdomains
+        self.exclude = exclude
+        self.include = include
+
+    def allowed(self, url: str) -> bool:
+        parsed = urlparse(url)
+        netloc = parsed.netloc
+        if self.include_subdomains:
+            if not (netloc == self.start_host or netloc.endswith("." + self.start_host)):
+                return False
+        elif self.same_origin:
+            if netloc != self.start_host:
+                return False
+        if not parsed.path.startswith(self.start_prefix):
+            return False
+        if self.exclude and any(p in url for p in self.exclude):
+            return False
+        if self.include and not any(p in url for p in self.include):
+            return False
+        return True
+
+
+def make_urls(count: int, distinct: int, rng: random.Random) -> list[str]:
+    hosts = ["example.com", "www.example.com", "cdn.example.com", "other.org"]
+    pool = []
+    for i in range(distinct):
+        host = rng.choice(hosts)
+        section = rng.choice(["docs", "blog", "docs/api", "docs/guide", "static"])
+        query = f"?page={rng.randrange(50)}" if rng.random() < 0.2 else ""
+        pool.append(f"https://{host}/{section}/item-{i}.html{query}")
+    # 同じURLが何度も現れる実際のクロールに近づける
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def make_patterns(count: int, rng: random.Random) -> list[str]:
+    return [f"/docs/api/v{rng.randrange(1000)}/" if i % 2 else f"item-{rng.randrange(10 ** 6)}."
+            for i in range(count)]
+
+
+def measure(func, urls: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for url in urls:
+            func(url)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawl scope filter")
+    parser.add_argument("--urls", type=int, default=200000, help="判定するURL数")
+    parser.add_argument("--distinct", type=int, default=50000, help="異なるURLの数")
+    parser.add_argument("--patterns", type=int, default=300, help="除外パターン数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最良値を表示）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    urls = make_urls(args.urls, args.distinct, rng)
+    exclude = make_patterns(args.patterns, rng)
+    options = dict(same_origin=True, include_subdomains=True, exclude=exclude, include=[])
+
+    legacy = LegacyFilter(START_URL, **options)
+    compiled = ScopeFilter(START_URL, cache_size=0, **options)
+    memoized = ScopeFilter(START_URL, **options)
+    mismatches = sum(legacy.allowed(u) != compiled.allowed(u) for u in urls[:args.distinct])
+    if mismatches:
+        raise SystemExit(f"{mismatches} verdicts differ from the legacy filter")
+
+    print(f"{args.urls} URLs ({args.distinct} distinct), {args.patterns} exclude patterns")
+    baseline = measure(legacy.allowed, urls, args.repeat)
+    for name, func in (("legacy", legacy.allowed), ("compiled", compiled.allowed),
+                       ("compiled+lru", memoized.allowed)):
+        elapsed = baseline if name == "legacy" else measure(func, urls, args.repeat)
+        print(f"{name:>13}: {elapsed:8.3f}s  {args.urls / elapsed:12,.0f} URL/s  "
+              f"x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
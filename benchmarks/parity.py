@@ -0,0 +1,88 @@
+"""
+リンク抽出バックエンドの結果を共通の HTML コーパスで比較する。
+すべてのバックエンドが同じ (属性値, タグ名) の列を文書順に返すことを確認し、
+異なる結果を返した文書を表示する。インストールされていないバックエンドは飛ばす。
+クロール側はページ内の重複リンクを除くため、最初に現れた順の重複のない列で比べる
+（selectolax は閉じていない <a> を HTML5 の規則で作り直し、同じリンクを重ねて返す）。
+
+    python -m benchmarks.parity
+"""
+import sys
+
+from href_hound.extractor import EXTRACTORS, get_extractor, tag_attrs_for
+
+from .synthetic_site import SiteShape, SyntheticSite
+
+# 名前 -> HTML。パーサごとに扱いが分かれやすい構文を1つずつ含める
+CORPUS = {
+    "basic": '<html><body><a href="a.html">a</a><A HREF="B.html">b</A>'
+             '<a href="#top">top</a><a href="">empty</a><a>none</a></body></html>',
+    "resources": '<head><link rel="stylesheet" href="s.css"><script src="j.js"></script></head>'
+                 '<body><img src="i.png"><img alt="no src"></body>',
+    "entities": '<a href="c&amp;d.html">x</a><a href="q.html?a=1&b=2">y</a>'
+                '<a href="%E6%97%A5.html">z</a><a href="日本語.html">w</a>',
+    "unquoted": "<a href=u.html>u</a><a href='single.html'>s</a><img src=p.png alt=x>",
+    "duplicate-attributes": '<a href="first.html" href="second.html">d</a>'
+                            '<img src="a.png" src="b.png">',
+    "template": '<template><a href="in-template.html">t</a></template><a href="after.html">a</a>',
+    "nested-template": '<template><div><template><img src="deep.png"></template></div>'
+                       '<a href="outer.html">o</a></template>',
+    "template-attribute": '<template data-x="a>b"><a href="t.html">t</a></template>',
+    "empty": "",
+    "whitespace": "  \n\t ",
+    "comment-only": "<!-- generated -->",
+    "comment-hides-link": '<!-- <a href="commented.html">c</a> --><a href="visible.html">v</a>',
+    "script-text": "<script>var s = '<a href=\"in-script.html\">';</script>"
+                   '<a href="after-script.html">a</a>',
+    "unclosed": '<a href="unclosed.html"><div><a href="nested.html">n</a>',
+    "table": '<table><tr><td><a href="cell.html">t</td></tr></table>',
+    "xhtml": '<?xml version="1.0" encoding="utf-8"?><!DOCTYPE html>'
+             '<html xmlns="http://www.w3.org/1999/xhtml"><body><a href="/x">x</a></body></html>',
+    "synthetic-page": SyntheticSite(SiteShape(page_size=4096)).page_html(3),
+}
+
+
+def available_backends() -> list[str]:
+    names = []
+    for name in EXTRACTORS:
+        try:
+            get_extractor(name, tag_attrs_for(True))
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def check_parity(backends: list[str]) -> list[str]:
+    """
+    コーパスの文書ごとに各バックエンドの抽出結果を比べ、食い違いの説明を返す。
+    """
+    mismatches = []
+    for check_resources in (False, True):
+        extractors = {name: get_extractor(name, tag_attrs_for(check_resources))
+                      for name in backends}
+        for doc, html in CORPUS.items():
+            results = {}
+            for name, extractor in extractors.items():
+                try:
+                    results[name] = list(dict.fromkeys(extractor.extract(html)))
+                except Exception as e:
+                    results[name] = f"{type(e).__name__}: {e}"
+            if len({repr(links) for links in results.values()}) > 1:
+                detail = "; ".join(f"{name}={links}" for name, links in results.items())
+                mismatches.append(f"{doc} (check_resources={check_resources}): {detail}")
+    return mismatches
+
+
+def main():
+    backends = available_backends()
+    mismatches = check_parity(backends)
+    for line in mismatches:
+        print(line)
+    print(f"{len(CORPUS)} documents, backends: {', '.join(backends)}, "
+          f"{len(mismatches)} mismatch(es)", file=sys.stderr)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+href-hound のベンチマークスイート。
+合成サイトに対して LinkChecker.run() を最後まで実行するシナリオと、
+リンク抽出・クロール範囲判定・レポート出力を個別に計測するシナリオを実行し、
+結果を JSON に保存する。保存済みの結果と比較して性能の劣化を検出できる。
+
+    python -m benchmarks.suite -o baseline.json
+    python -m benchmarks.suite --compare baseline.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Optional
+
+from href_hound.config import Config
+from href_hound.crawler import LinkChecker
+from href_hound.extractor import EXTRACTORS, extract_urls, tag_attrs_for
+from href_hound.reporter import WRITERS, create_writer
+from href_hound.results import LinkResult
+from href_hound.scope import ScopeFilter
+
+from .parity import check_parity
+from .synthetic_site import SiteShape, SyntheticSite, serve_forever
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# LinkChecker.run() を実行するシナリオ: (サイトの形, Config の追加設定)
+CRAWL_SCENARIOS = {
+    "crawl-small": (SiteShape(pages=300), {}),
+    "crawl-wide": (SiteShape(pages=2000, fanout=20, cross_links=10, page_size=4096), {}),
+    "crawl-large-pages": (SiteShape(pages=300, page_size=256 * 1024), {}),
+    "crawl-assets": (SiteShape(pages=500, assets=10, asset_pool=2000, asset_size=64 * 1024), {}),
+    "crawl-flaky-slow": (SiteShape(pages=300, slow_ratio=0.1, slow_delay=0.1, flaky_ratio=0.1),
+                         {"retry_backoff": 0.05}),
+}
+
+# 値が大きいほど良い指標（それ以外は小さいほど良い）
+HIGHER_IS_BETTER = {"pages_per_sec", "requests_per_sec", "links_per_sec", "urls_per_sec",
+                    "results_per_sec"}
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS はバイト単位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_crawl(name: str, concurrency: int) -> dict:
+    """
+    合成サイトのサーバーを別プロセスで起動し、このプロセスでクロールして計測する。
+    ピークメモリを正しく測れるよう、シナリオごとに新しいプロセスで呼び出す。
+    """
+    shape, overrides = CRAWL_SCENARIOS[name]
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    server = ctx.Process(target=serve_forever, args=(shape, ready), daemon=True)
+    server.start()
+    try:
+        start_url = ready.get(timeout=30)
+        config = Config(start_url=start_url, output="", max_depth=-1, check_resources=True,
+                        concurrency=concurrency, **overrides)
+        checker = LinkChecker(config)
+        started = time.perf_counter()
+        results = asyncio.run(checker.run())
+        elapsed = time.perf_counter() - started
+        with urllib.request.urlopen(start_url.split("/site/")[0] + "/__stats") as resp:
+            requests = json.load(resp)["requests"]
+    finally:
+        server.terminate()
+        server.join()
+    # 同じリンク先の結果は判定を共有しているため、リンク先ごとに1件として数える
+    latencies = {r.target: r.latency for r in results if r.latency is not None}
+    latency_ms = [v * 1000 for v in latencies.values()]
+    return {
+        "elapsed": round(elapsed, 3),
+        "pages": checker._count_pages,
+        "results": len(results),
+        "broken": sum(r.is_broken for r in results),
+        "requests": requests,
+        "pages_per_sec": round(checker._count_pages / elapsed, 1),
+        "requests_per_sec": round(requests / elapsed, 1),
+        "latency_p50_ms": round(percentile(latency_ms, 0.5) or 0, 2),
+        "latency_p99_ms": round(percentile(latency_ms, 0.99) or 0, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_extract(repeat: int) -> dict:
+    """
+    合成ページからのリンク抽出を、利用できるパーサごとに計測し、結果の一致も確認する。
+    """
+    site = SyntheticSite(SiteShape(pages=200, page_size=32 * 1024))
+    pages = [site.page_html(i) for i in range(200)]
+    links = sum(len(extract_urls(html, "http://example.com/site/", "bs4", tag_attrs_for(True)))
+                for html in pages)
+    metrics = {}
+    for parser in EXTRACTORS:
+        try:
+            extract_urls(pages[0], "http://example.com/site/", parser, tag_attrs_for(True))
+        except ImportError:
+            continue
+        elapsed = best_of(repeat, lambda: [
+            extract_urls(html, "http://example.com/site/", parser, tag_attrs_for(True))
+            for html in pages])
+        metrics[parser] = {"elapsed": round(elapsed, 4),
+                           "links_per_sec": round(links / elapsed, 1)}
+    # 計測したバックエンドが同じリンクを抽出するか
+    mismatches = check_parity([parser for parser in EXTRACTORS if parser in metrics])
+    for line in mismatches:
+        print(f"parity mismatch: {line}", file=sys.stderr)
+    metrics["parity"] = {"mismatches": len(mismatches)}
+    return metrics
+
+
+def bench_scope(repeat: int) -> dict:
+    """
+    クロール範囲判定を、繰り返し現れるURL列で計測する（LRU の効果を含む）。
+    """
+    rng = random.Random(0)
+    pool = [f"https://{rng.choice(['example.com', 'cdn.example.com', 'other.org'])}"
+            f"/{rng.choice(['site', 'blog', 'site/api'])}/item-{i}.html" for i in range(20000)]
+    urls = [rng.choice(pool) for _ in range(100000)]
+    exclude = [f"/site/api/v{i}/" for i in range(100)] + ["re:\\.pdf$", "glob:*/private/*"]
+    metrics = {}
+    for name, cache_size in (("compiled", 0), ("memoized", 100000)):
+        def run():
+            allowed = ScopeFilter("https://example.com/site/", exclude=exclude,
+                                  cache_size=cache_size).allowed
+            for url in urls:
+                allowed(url)
+        elapsed = best_of(repeat, run)
+        metrics[name] = {"elapsed": round(elapsed, 4), "urls_per_sec": round(len(urls) / elapsed, 1)}
+    return metrics
+
+
+def bench_report(repeat: int) -> dict:
+    """
+    各形式のレポート出力を計測する。
+    """
+    rng = random.Random(0)
+    results = []
+    for i in range(50000):
+        status = 404 if rng.random() < 0.2 else 200
+        results.append(LinkResult(f"https://example.com/site/p{i // 20}.html",
+                                  f"https://example.com/site/t{rng.randrange(10000)}.html",
+                                  status, None, status >= 400, 1, rng.random() / 10))
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in WRITERS:
+            def run():
+                writer = create_writer(fmt, os.path.join(tmp, f"report.{fmt}"), include_ok=True)
+                for r in results:
+                    writer.add(r)
+                writer.close()
+            elapsed = best_of(repeat, run)
+            metrics[fmt] = {"elapsed": round(elapsed, 4),
+                            "results_per_sec": round(len(results) / elapsed, 1)}
+    return metrics
+
+
+def run_suite(names: list[str], repeat: int, concurrency: int) -> dict:
+    scenarios = {}
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr)
+        if name in CRAWL_SCENARIOS:
+            runs = []
+            for _ in range(repeat):
+                # 新しいプロセスで実行してピークメモリをシナリオごとに測る
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    runs.append(pool.submit(run_crawl, name, concurrency).result())
+            # 経過時間が中央値の実行を代表値とする
+            runs.sort(key=lambda m: m["elapsed"])
+            scenarios[name] = runs[len(runs) // 2]
+        else:
+            for sub, metrics in MICRO_BENCHMARKS[name](repeat).items():
+                scenarios[f"{name}/{sub}"] = metrics
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "concurrency": concurrency,
+        "shapes": {name: asdict(CRAWL_SCENARIOS[name][0]) for name in names
+                   if name in CRAWL_SCENARIOS},
+        "scenarios": scenarios,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    基準の結果と比較して表を表示し、threshold を超えて悪化した指標を返す。
+    """
+    regressions = []
+    for name, metrics in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for metric, value in metrics.items():
+            old = base.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if metric not in HIGHER_IS_BETTER and metric not in (
+                    "elapsed", "latency_p50_ms", "latency_p99_ms", "peak_rss_mb"):
+                continue
+            change = (value - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            mark = "  REGRESSION" if worse > threshold else ""
+            print(f"{name:28} {metric:18} {old:>12} -> {value:>12}  {change:+7.1%}{mark}")
+            if mark:
+                regressions.append(f"{name} {metric}")
+    return regressions
+
+
+MICRO_BENCHMARKS = {
+    "extract": bench_extract,
+    "scope": bench_scope,
+    "report": bench_report,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the href-hound benchmark suite")
+    parser.add_argument("scenarios", nargs="*",
+                        help=f"実行するシナリオ (default: すべて): "
+                             f"{', '.join(list(CRAWL_SCENARIOS) + list(MICRO_BENCHMARKS))}")
+    parser.add_argument("-o", "--output", help="結果を保存する JSON ファイル")
+    parser.add_argument("--compare", metavar="BASELINE", help="比較する基準の JSON ファイル")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="劣化と見なす変化率 (default: 0.1 = 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="劣化した指標があれば終了コード 1 で終了する")
+    parser.add_argument("--repeat", type=int, default=3, help="各シナリオの実行回数")
+    parser.add_argument("--concurrency", type=int, default=10, help="クロールの同時リクエスト数")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(CRAWL_SCENARIOS) + list(MICRO_BENCHMARKS)
+    unknown = [n for n in names if n not in CRAWL_SCENARIOS and n not in MICRO_BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    result = run_suite(names, max(1, args.repeat), args.concurrency)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"{len(regressions)} regression(s)", file=sys.stderr)
+            sys.exit(1)
+    elif not args.output:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
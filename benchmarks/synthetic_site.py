@@ -0,0 +1,150 @@
+"""
+ベンチマーク用の合成サイトを配信する aiohttp サーバー。
+ページ数・リンク数・ページサイズ・リンク切れの割合・遅い/不安定なページ・
+バイナリのリソースを SiteShape で指定する。同じ設定からは常に同じサイトを生成する。
+
+    python -m benchmarks.synthetic_site --pages 1000 --fanout 8
+"""
+import argparse
+import asyncio
+import random
+from dataclasses import asdict, dataclass
+
+from aiohttp import web
+
+# サイトを配置するパス（起点URLはこのパス）
+SITE_PATH = "/site/"
+
+
+@dataclass
+class SiteShape:
+    # ページ数
+    pages: int = 500
+    # 1ページから子ページへのリンク数（ページは木構造につながる）
+    fanout: int = 8
+    # 1ページから既存ページへの重複リンク数
+    cross_links: int = 4
+    # ページ本文の目安のサイズ（バイト）
+    page_size: int = 8 * 1024
+    # 存在しないページへのリンクの割合（リンク数に対する比率）
+    broken_ratio: float = 0.05
+    # 応答が遅いページの割合と遅延（秒）
+    slow_ratio: float = 0.0
+    slow_delay: float = 0.2
+    # 最初のリクエストに 503 を返すページの割合
+    flaky_ratio: float = 0.0
+    # 1ページあたりの画像リンク数と、サイト全体の画像の種類数・サイズ（バイト）
+    assets: int = 2
+    asset_pool: int = 50
+    asset_size: int = 16 * 1024
+    seed: int = 0
+
+
+class SyntheticSite:
+    """
+    SiteShape に従ってページを生成して返す。受けたリクエスト数を数える。
+    """
+    def __init__(self, shape: SiteShape):
+        self.shape = shape
+        self.requests = 0
+        self._served: set[str] = set()
+        rng = random.Random(shape.seed)
+        self._slow = {i for i in range(shape.pages) if rng.random() < shape.slow_ratio}
+        self._flaky = {i for i in range(shape.pages) if rng.random() < shape.flaky_ratio}
+        self._asset = bytes(rng.getrandbits(8) for _ in range(shape.asset_size))
+
+    def page_html(self, i: int) -> str:
+        shape = self.shape
+        rng = random.Random(shape.seed * 1000003 + i)
+        links = []
+        for k in range(shape.fanout):
+            child = i * shape.fanout + k + 1
+            if child < shape.pages:
+                links.append(f'<a href="p{child}.html">page {child}</a>')
+        for _ in range(shape.cross_links):
+            links.append(f'<a href="p{rng.randrange(max(1, i + 1))}.html">back</a>')
+        total = len(links) + shape.assets
+        for k in range(sum(rng.random() < shape.broken_ratio for _ in range(total))):
+            links.append(f'<a href="missing/{i}-{k}.html">missing</a>')
+        for _ in range(shape.assets):
+            links.append(f'<img src="assets/{rng.randrange(shape.asset_pool)}.bin">')
+        body = "\n".join(f"<li>{link}</li>" for link in links)
+        filler = max(0, shape.page_size - len(body) - 200)
+        text = ("lorem ipsum dolor sit amet " * (filler // 27 + 1))[:filler]
+        return (f"<!DOCTYPE html><html><head><title>Page {i}</title></head><body>"
+                f"<h1>Page {i}</h1><ul>{body}</ul><p>{text}</p></body></html>")
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        path = request.path
+        if path == "/__stats":
+            return web.json_response({"requests": self.requests - 1})
+        if not path.startswith(SITE_PATH):
+            return web.Response(status=404)
+        name = path[len(SITE_PATH):] or "p0.html"
+        if name.startswith("assets/"):
+            return web.Response(body=self._asset, content_type="application/octet-stream")
+        if not (name.startswith("p") and name.endswith(".html")):
+            return web.Response(status=404)
+        try:
+            i = int(name[1:-5])
+        except ValueError:
+            return web.Response(status=404)
+        if i >= self.shape.pages:
+            return web.Response(status=404)
+        if i in self._flaky and path not in self._served:
+            self._served.add(path)
+            return web.Response(status=503)
+        if i in self._slow:
+            await asyncio.sleep(self.shape.slow_delay)
+        return web.Response(text=self.page_html(i), content_type="text/html")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        return app
+
+
+async def start(shape: SiteShape, host: str = "127.0.0.1", port: int = 0):
+    """
+    サーバーを起動し、(AppRunner, 起点URL) を返す。port 0 は空いているポートを使う。
+    """
+    runner = web.AppRunner(SyntheticSite(shape).app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}{SITE_PATH}"
+
+
+def serve_forever(shape: SiteShape, ready=None):
+    """
+    別プロセスでサーバーを動かす。起点URLを ready (multiprocessing の Queue) に送る。
+    """
+    async def main():
+        runner, url = await start(shape)
+        if ready is not None:
+            ready.put(url)
+        else:
+            print(f"Serving {asdict(shape)} at {url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic site for benchmarks")
+    for name, default in asdict(SiteShape()).items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args()
+    serve_forever(SiteShape(**vars(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def default_cache_path() -> str:
+    """
+    CLI と GUI が共有する判定キャッシュの既定パス。
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "href-hound", "verdicts.sqlite3")
+
+
+class VerdictCache:
+    """
+    実行をまたいでリンク判定を保存するキャッシュ。
+    判定結果ごとに有効期間を変え（正常は長く、リンク切れ・エラーは短く）、
+    件数が上限を超えたら最終利用が古いものから削除する。
+    ディスク (SQLite) の手前に件数上限付きのメモリ LRU を置き、書き込みはまとめて行う。
+    """
+    COMMIT_EVERY = 500
+
+    def __init__(self, path: str, max_entries: int = 100000, memory_entries: int = 10000,
+                 ttl_ok: float = 7 * 86400, ttl_broken: float = 3600,
+                 ttl_error: float = 600):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = max(1, memory_entries)
+        self.ttl_ok = ttl_ok
+        self.ttl_broken = ttl_broken
+        self.ttl_error = ttl_error
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, status INTEGER, error TEXT, is_broken INTEGER, "
+            "expires REAL, last_used REAL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        # key -> (status, error, is_broken, expires)
+        self._memory: OrderedDict[str, tuple] = OrderedDict()
+        self._dirty: dict[str, tuple] = {}
+        self._touched: dict[str, float] = {}
+
+    def get(self, key: str) -> Optional[tuple[Optional[int], Optional[str], bool]]:
+        """
+        有効期限内の (status, error, is_broken) を返す。なければ None。
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        else:
+            entry = self._conn.execute(
+                "SELECT status, error, is_broken, expires FROM verdicts WHERE key = ?",
+                (key,)).fetchone()
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or entry[3] < now:
+            return None
+        self._touched[key] = now
+        self._maybe_flush()
+        return entry[0], entry[1], bool(entry[2])
+
+    def put(self, key: str, status: Optional[int], error: Optional[str], is_broken: bool):
+        now = time.time()
+        if error is not None:
+            ttl = self.ttl_error
+        elif is_broken:
+            ttl = self.ttl_broken
+        else:
+            ttl = self.ttl_ok
+        entry = (status, error, is_broken, now + ttl)
+        self._remember(key, entry)
+        self._dirty[key] = entry
+        self._touched[key] = now
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._touched) >= self.COMMIT_EVERY:
+            self.flush()
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        """
+        未保存の判定と利用時刻を書き込み、期限切れと上限超過分を削除する。
+        """
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, status, error, is_broken, expires, self._touched.get(key, now))
+                 for key, (status, error, is_broken, expires) in self._dirty.items()])
+            self._conn.executemany(
+                "UPDATE verdicts SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items() if key not in self._dirty])
+            self._conn.execute("DELETE FROM verdicts WHERE expires < ?", (now,))
+            if self.max_entries > 0:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM verdicts WHERE key IN ("
+                        "SELECT key FROM verdicts ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,))
+        self._dirty = {}
+        self._touched = {}
+
+    def close(self):
+        self.flush()
+        self._conn.close()
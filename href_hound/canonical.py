@@ -0,0 +1,100 @@
+import re
+from fnmatch import fnmatchcase
+from typing import Iterable
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+
+# --strip-tracking-params で除去するクエリパラメータ（fnmatch パターン）
+TRACKING_PARAMS = [
+    "utm_*", "gclid", "fbclid", "msclkid", "mc_cid", "mc_eid",
+    "sessionid", "jsessionid", "phpsessid", "sid",
+]
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_PERCENT_RE = re.compile(r"%[0-9a-fA-F]{2}")
+# パーセントエンコードを外してよい非予約文字
+_UNRESERVED = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_percent(match: re.Match) -> str:
+    char = chr(int(match.group(0)[1:], 16))
+    if char in _UNRESERVED:
+        return char
+    return match.group(0).upper()
+
+
+def remove_dot_segments(path: str) -> str:
+    """
+    RFC 3986 5.2.4 に従って "." と ".." のセグメントを解決する。
+    """
+    output: list[str] = []
+    segments = path.split("/")
+    for i, seg in enumerate(segments):
+        if seg == ".":
+            if i == len(segments) - 1:
+                output.append("")
+        elif seg == "..":
+            if len(output) > 1:
+                output.pop()
+            if i == len(segments) - 1:
+                output.append("")
+        else:
+            output.append(seg)
+    result = "/".join(output)
+    if path.startswith("/") and not result.startswith("/"):
+        result = "/" + result
+    return result
+
+
+class UrlCanonicalizer:
+    """
+    重複判定用に URL を正規化する。
+    フラグメント除去、スキーム・ホストの小文字化、既定ポートの除去、
+    ドットセグメントと連続スラッシュの解決、パーセントエンコードの正規化を行い、
+    設定に応じてクエリパラメータの並べ替えと除去、パスの大文字小文字の同一視を行う。
+    """
+    def __init__(self, sort_query: bool = False, strip_params: Iterable[str] = (),
+                 ignore_path_case: bool = False):
+        self.sort_query = sort_query
+        self.strip_params = [p.lower() for p in strip_params]
+        self.ignore_path_case = ignore_path_case
+
+    def canonicalize(self, url: str) -> str:
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url.split("#", 1)[0]
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc
+        if parts.hostname is not None:
+            host = parts.hostname.lower()
+            if ":" in host:
+                host = f"[{host}]"
+            userinfo = netloc.rpartition("@")[0]
+            netloc = f"{userinfo}@{host}" if "@" in netloc else host
+            if port is not None and DEFAULT_PORTS.get(scheme) != port:
+                netloc += f":{port}"
+        path = re.sub(r"/{2,}", "/", parts.path)
+        if self.ignore_path_case:
+            path = path.lower()
+        path = remove_dot_segments(_PERCENT_RE.sub(_normalize_percent, path))
+        if not path and netloc:
+            path = "/"
+        query = self._normalize_query(parts.query)
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    def _normalize_query(self, query: str) -> str:
+        if not query or not (self.sort_query or self.strip_params):
+            return query
+        pairs = [p for p in query.split("&") if p]
+        if self.strip_params:
+            pairs = [p for p in pairs if not self._is_stripped(p)]
+        if self.sort_query:
+            pairs.sort()
+        return "&".join(pairs)
+
+    def _is_stripped(self, pair: str) -> bool:
+        name = unquote_plus(pair.split("=", 1)[0]).lower()
+        return any(fnmatchcase(name, p) for p in self.strip_params)
@@ -1,9 +1,13 @@
 import argparse
 import asyncio
 import sys
+from .cache import default_cache_path
 from .config import Config
 from .crawler import LinkChecker
-from .reporter import generate_report
+from .dedup import DEDUP_MODES
+from .extractor import EXTRACTORS
+from .reporter import WRITERS, create_writer, format_for_path
+from .shard import ShardCoordinator, SocketTransport
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -15,8 +19,23 @@ def parse_args():
     )
     parser.add_argument(
         "-o", "--output",
-        default="report.html",
-        help="出力HTMLレポートのファイルパス (default: report.html)"
+        dest="outputs",
+        action="append",
+        default=[],
+        help="出力レポートのファイルパス (複数指定可、default: report.html)"
+    )
+    parser.add_argument(
+        "--format",
+        dest="formats",
+        action="append",
+        choices=sorted(WRITERS),
+        default=[],
+        help="出力レポートの形式 (--output と同じ順に指定、省略時は拡張子から推定)"
+    )
+    parser.add_argument(
+        "--report-all",
+        action="store_true",
+        help="jsonl / csv / junit レポートに正常なリンクも出力"
     )
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
@@ -40,24 +59,83 @@ def parse_args():
         default=3,
         help="最大クロール深度 (default: 3, -1 for unlimited)"
     )
+    parser.add_argument(
+        "--sitemap",
+        action="store_true",
+        help="サイトマップ（robots.txt の Sitemap、なければ /sitemap.xml）のページもクロールの起点にする"
+    )
+    parser.add_argument(
+        "--sitemap-url",
+        action="append",
+        default=[],
+        dest="sitemap_urls",
+        metavar="URL",
+        help="読み込むサイトマップのURL（複数指定可、gzip 圧縮・サイトマップインデックス対応）"
+    )
+    parser.add_argument(
+        "--respect-robots",
+        action="store_true",
+        help="起点ホストの robots.txt の Disallow と Crawl-delay に従う"
+    )
     parser.add_argument(
         "--exclude",
         action="append",
         default=[],
-        help="除外URLパターン (部分文字列マッチ、複数指定可)"
+        help="除外URLパターン (部分文字列マッチ、re: で正規表現、glob: でワイルドカード、複数指定可)"
     )
     parser.add_argument(
         "--include",
         dest="include",
         action="append",
         default=[],
-        help="包含URLパターン (部分文字列マッチ、複数指定可)"
+        help="包含URLパターン (部分文字列マッチ、re: で正規表現、glob: でワイルドカード、複数指定可)"
+    )
+    parser.add_argument(
+        "--sort-query",
+        action="store_true",
+        help="クエリパラメータの順序が異なるURLを同一視"
+    )
+    parser.add_argument(
+        "--strip-param",
+        dest="strip_params",
+        action="append",
+        default=[],
+        help="重複判定で無視するクエリパラメータ名 (fnmatch パターン、複数指定可)"
+    )
+    parser.add_argument(
+        "--strip-tracking-params",
+        action="store_true",
+        help="utm_* やセッションIDなどのトラッキングパラメータを重複判定で無視"
+    )
+    parser.add_argument(
+        "--ignore-path-case",
+        action="store_true",
+        help="パスの大文字小文字が異なるURLを同一視"
     )
     parser.add_argument(
         "--check-resources",
         action="store_true",
         help="リソースリンクもチェック (img, link, script)"
     )
+    parser.add_argument(
+        "--parser",
+        choices=sorted(EXTRACTORS),
+        default="bs4",
+        help="リンク抽出バックエンド (default: bs4)"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="リンク抽出を行うプロセス数 (default: 0 = イベントループ内で抽出、"
+             "--local-root 指定時は CPU コア数)"
+    )
+    parser.add_argument(
+        "--local-root",
+        default="",
+        metavar="DIR",
+        help="起点URL以下をこのディレクトリのファイルとしてチェックする（外部リンクのみ HTTP で確認）"
+    )
     parser.add_argument(
         "--user-agent",
         default="href-hound/1.0",
@@ -75,17 +153,218 @@ def parse_args():
         default=5,
         help="同時リクエスト数 (default: 5)"
     )
+    parser.add_argument(
+        "--frontier-size",
+        type=int,
+        default=10000,
+        help="メモリ上に保持するクロール待ちURLの最大数 (default: 10000)"
+    )
+    parser.add_argument(
+        "--compact-urls",
+        action="store_true",
+        help="訪問済みURLとリンク判定をURL文字列ではなく64ビットのフィンガープリントで保持する"
+    )
+    parser.add_argument(
+        "--url-table-dir",
+        default="",
+        metavar="DIR",
+        help="--compact-urls の表を置く一時ファイルのディレクトリ（default: メモリ上に保持）"
+    )
+    parser.add_argument(
+        "--max-per-host",
+        type=int,
+        default=0,
+        help="ホストごとの同時リクエスト数 (default: 0 = 制限なし)"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="ホストごとの同時リクエスト数を応答時間と 429/503/タイムアウトから自動調整する"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="ホストごとのリクエストレート上限（件/秒、default: 0 = 制限なし）"
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="レート制限時に連続して送れるリクエスト数 (default: 1)"
+    )
     parser.add_argument(
         "--delay",
         type=float,
         default=0.0,
-        help="リクエスト間隔（秒、default: 0.0）"
+        help="ホストごとのリクエスト間隔（秒、default: 0.0）"
+    )
+    parser.add_argument(
+        "--dns-cache-ttl",
+        type=int,
+        default=300,
+        help="DNSキャッシュの有効期間（秒、default: 300）"
+    )
+    parser.add_argument(
+        "--keepalive-timeout",
+        type=float,
+        default=30.0,
+        help="keep-alive接続の保持時間（秒、default: 30.0）"
+    )
+    parser.add_argument(
+        "--max-body-size",
+        type=int,
+        default=5 * 1024 * 1024,
+        help="ページ本文の最大読み込みサイズ（バイト、default: 5242880、0 で無制限）"
     )
     parser.add_argument(
         "--error-codes",
         default="",
         help="リンク切れ判定HTTPステータスコード (カンマ区切り)"
     )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="通信エラー・タイムアウト・一時的なエラーステータスの再試行回数 (default: 2)"
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=0.5,
+        help="再試行の待ち時間の基準（秒、指数的に増やしランダムに分散、default: 0.5）"
+    )
+    parser.add_argument(
+        "--retry-max-backoff",
+        type=float,
+        default=30.0,
+        help="再試行の待ち時間の上限（秒、default: 30.0）"
+    )
+    parser.add_argument(
+        "--retry-statuses",
+        default="429,500,502,503,504",
+        help="再試行するHTTPステータスコード (カンマ区切り、default: 429,500,502,503,504)"
+    )
+    parser.add_argument(
+        "--state-file",
+        default="",
+        help="クロールの途中経過を保存する状態ファイル (SQLite)"
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="STATE_FILE",
+        default="",
+        help="状態ファイルから前回中断したクロールを再開"
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=60.0,
+        help="状態ファイルへの保存間隔（秒、default: 60.0）"
+    )
+    parser.add_argument(
+        "--incremental",
+        metavar="PAGE_DB",
+        default="",
+        help="ページの ETag/Last-Modified と抽出リンクを保存し、次回は変更のないページを再解析しない"
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="",
+        help="内容が処理済みのページと同じページは解析せず、抽出済みのリンクをチェックしない "
+             "(exact: 本文が一致、near: SimHash で近い内容)"
+    )
+    parser.add_argument(
+        "--dedup-distance",
+        type=int,
+        default=3,
+        help="--dedup near で同じ内容と見なすハミング距離（64 ビット中、default: 3）"
+    )
+    parser.add_argument(
+        "--dedup-ignore-boilerplate",
+        action="store_true",
+        help="nav/header/footer/aside 要素を除いて内容を比較する"
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--verdict-cache",
+        default="",
+        metavar="PATH",
+        help="実行をまたいでリンク判定を PATH にキャッシュ"
+    )
+    cache_group.add_argument(
+        "--use-verdict-cache",
+        action="store_true",
+        help=f"実行をまたいでリンク判定を既定のパス ({default_cache_path()}) にキャッシュ"
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=100000,
+        help="判定キャッシュの最大件数 (default: 100000)"
+    )
+    parser.add_argument(
+        "--cache-ttl-ok",
+        type=float,
+        default=7 * 86400,
+        help="正常なリンクの判定キャッシュ有効期間（秒、default: 604800）"
+    )
+    parser.add_argument(
+        "--cache-ttl-broken",
+        type=float,
+        default=3600,
+        help="リンク切れの判定キャッシュ有効期間（秒、default: 3600）"
+    )
+    parser.add_argument(
+        "--cache-ttl-error",
+        type=float,
+        default=600,
+        help="通信エラーの判定キャッシュ有効期間（秒、default: 600）"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="URL を正規化した形のハッシュで N 個のワーカープロセスに分けてクロール (default: 0 = 分けない)"
+    )
+    parser.add_argument(
+        "--shard-listen",
+        metavar="HOST:PORT",
+        default="",
+        help="ワーカーと TCP で接続する (default: このマシンの子プロセスとキューで接続)。"
+             "他のマシンでは python -m href_hound.shard --connect HOST:PORT でワーカーを起動"
+    )
+    parser.add_argument(
+        "--shard-spawn",
+        type=int,
+        default=None,
+        help="--shard-listen 時にこのマシンで起動するワーカー数 (default: --shards と同じ)"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="PATH",
+        default="",
+        help="終了時に処理段階ごとの所要時間やキャッシュのヒット数などを OpenMetrics 形式で保存"
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        default="",
+        help="終了時に計測値の集計を JSON で保存"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="クロール中に計測値を http://127.0.0.1:PORT/metrics で公開 (default: 0 = 無効)"
+    )
+    parser.add_argument(
+        "--profile",
+        default="",
+        metavar="PATH",
+        help="cProfile のプロファイルを PATH に、tracemalloc の集計を PATH.tracemalloc.txt に保存"
+    )
     return parser.parse_args()
 
 def main():
@@ -101,34 +380,130 @@ def main():
             sys.exit(1)
     else:
         error_codes = []
+    try:
+        retry_statuses = [int(x) for x in args.retry_statuses.split(",") if x.strip()]
+    except ValueError:
+        print("retry-statuses must be comma-separated integers", file=sys.stderr)
+        sys.exit(1)
+    outputs = args.outputs or ["report.html"]
+    if args.formats and len(args.formats) != len(outputs):
+        print("--format must be given once for each --output", file=sys.stderr)
+        sys.exit(1)
+    formats = args.formats or [format_for_path(path) for path in outputs]
 
     config = Config(
         start_url=args.start_url,
-        output=args.output,
+        output=outputs[0],
         same_origin=same_origin,
         include_subdomains=include_subdomains,
         max_depth=args.max_depth,
+        sitemap=args.sitemap,
+        sitemap_urls=args.sitemap_urls,
+        respect_robots=args.respect_robots,
         exclude=args.exclude,
         include=args.include,
+        sort_query=args.sort_query,
+        strip_params=args.strip_params,
+        strip_tracking_params=args.strip_tracking_params,
+        ignore_path_case=args.ignore_path_case,
         check_resources=args.check_resources,
+        parser=args.parser,
+        parse_workers=args.parse_workers,
+        local_root=args.local_root,
         user_agent=args.user_agent,
         timeout=args.timeout,
         concurrency=args.concurrency,
+        frontier_size=args.frontier_size,
+        compact_urls=args.compact_urls,
+        url_table_dir=args.url_table_dir,
+        max_per_host=args.max_per_host,
+        adaptive=args.adaptive,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
         delay=args.delay,
-        error_codes=error_codes
+        dns_cache_ttl=args.dns_cache_ttl,
+        keepalive_timeout=args.keepalive_timeout,
+        max_body_size=args.max_body_size,
+        error_codes=error_codes,
+        retries=args.retries,
+        retry_backoff=args.retry_backoff,
+        retry_max_backoff=args.retry_max_backoff,
+        retry_statuses=retry_statuses,
+        # レポートに載るのはリンク切れのみ
+        broken_only=True,
+        state_file=args.resume or args.state_file,
+        resume=bool(args.resume),
+        checkpoint_interval=args.checkpoint_interval,
+        incremental_db=args.incremental,
+        content_dedup=args.dedup,
+        dedup_distance=args.dedup_distance,
+        dedup_ignore_boilerplate=args.dedup_ignore_boilerplate,
+        verdict_cache=default_cache_path() if args.use_verdict_cache else args.verdict_cache,
+        cache_max_entries=args.cache_max_entries,
+        cache_ttl_ok=args.cache_ttl_ok,
+        cache_ttl_broken=args.cache_ttl_broken,
+        cache_ttl_error=args.cache_ttl_error,
+        metrics_file=args.metrics_file,
+        metrics_json=args.metrics_json,
+        metrics_port=args.metrics_port,
+        profile=args.profile
     )
 
+    writers = []
     try:
-        checker = LinkChecker(config)
-        results = asyncio.run(checker.run())
-        generate_report(results, config.output)
-        print(f"Report generated: {config.output}")
+        # レポートはクロール中に結果を受け取りながら書き出す
+        for fmt, path in zip(formats, outputs):
+            writers.append(create_writer(fmt, path, include_ok=args.report_all))
+        if args.shards > 0 or args.shard_listen:
+            transport = None
+            if args.shard_listen:
+                host, _, port = args.shard_listen.rpartition(":")
+                transport = SocketTransport(
+                    host or "127.0.0.1", int(port), args.shard_spawn,
+                    on_listen=lambda h, p: print(f"Waiting for shard workers at {h}:{p}",
+                                                 file=sys.stderr))
+            coordinator = ShardCoordinator(config, max(1, args.shards), transport,
+                                           sinks=writers)
+            asyncio.run(coordinator.run())
+            for writer in writers:
+                writer.close()
+            for path in outputs:
+                print(f"Report generated: {path}")
+            if args.metrics_json:
+                print(f"Metrics written: {args.metrics_json} (one summary per shard)")
+            return
+        checker = LinkChecker(config, sinks=writers)
+        asyncio.run(checker.run())
+        for writer in writers:
+            writer.close()
+        for path in outputs:
+            print(f"Report generated: {path}")
+        usage = checker.memory_usage()
+        print("URL tables: " + ", ".join(
+            f"{name} {u['entries']} entries / {u['bytes'] / 2 ** 20:.1f} MiB"
+            + (f" ({u['mapped'] / 2 ** 20:.1f} MiB on disk)" if u["mapped"] else "")
+            for name, u in usage.items()))
+        # 並行して進む処理の時間の合計のため、経過時間を超えることがある
+        phases = sorted(checker.metrics.phases.items(), key=lambda item: -item[1].sum)
+        print("Time by phase (summed over tasks): " + ", ".join(
+            f"{phase} {h.sum:.1f}s" for phase, h in phases[:5] if h.count))
+        if args.dedup:
+            print(f"Duplicate pages: {checker.metrics.counters.get('pages_duplicate', 0)}")
+        for path in (args.metrics_file, args.metrics_json):
+            if path:
+                print(f"Metrics written: {path}")
+        if args.profile:
+            print(f"Profile written: {args.profile} ({args.profile}.tracemalloc.txt)")
     except KeyboardInterrupt:
         print("Interrupted by user", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        # 中断時もそれまでの結果で閉じた形式にする
+        for writer in writers:
+            writer.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
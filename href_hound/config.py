@@ -14,21 +14,110 @@ class Config:
     include_subdomains: bool = False
     # 最大クロール深度 (-1 で無制限)
     max_depth: int = 3
+    # サイトマップに載っているページもクロールの起点にする
+    # (robots.txt の Sitemap、記載がなければ起点ホストの /sitemap.xml)
+    sitemap: bool = False
+    # 読み込むサイトマップのURL（指定時は robots.txt / sitemap.xml を探さない）
+    sitemap_urls: List[str] = field(default_factory=list)
+    # 起点ホストの robots.txt の Disallow と Crawl-delay に従う
+    respect_robots: bool = False
     # 除外URLパターン（部分文字列マッチ）
     exclude: List[str] = field(default_factory=list)
     # 包含URLパターン（部分文字列マッチ）
     include: List[str] = field(default_factory=list)
+    # URL正規化: クエリパラメータを並べ替えて同一視
+    sort_query: bool = False
+    # URL正規化: 除去するクエリパラメータ名（fnmatch パターン）
+    strip_params: List[str] = field(default_factory=list)
+    # URL正規化: utm_* やセッションIDなどの既知のトラッキングパラメータを除去
+    strip_tracking_params: bool = False
+    # URL正規化: パスの大文字小文字を同一視
+    ignore_path_case: bool = False
     # リソースリンクもチェック
     check_resources: bool = False
+    # リンク抽出バックエンド (bs4 / lxml / selectolax / tokenizer)
+    parser: str = "bs4"
+    # リンク抽出を行うプロセス数 (0 でイベントループ内で抽出)
+    parse_workers: int = 0
     # User-Agent文字列
     user_agent: str = "href-hound/1.0"
     # タイムアウト（秒）
     timeout: float = 10.0
-    # 同時リクエスト数
+    # 同時リクエスト数（ページ処理ワーカー数も兼ねる）
     concurrency: int = 5
-    # リクエスト間隔（秒）
+    # メモリ上に保持するクロール待ちURLの最大数（超過分は一時ファイルへ退避）
+    frontier_size: int = 10000
+    # 訪問済みURLとリンク判定を URL の文字列ではなく 64 ビットのフィンガープリントで保持する
+    compact_urls: bool = False
+    # compact_urls の表を置く一時ファイルのディレクトリ（空文字でメモリ上に保持）
+    url_table_dir: str = ""
+    # ホストごとの同時リクエスト数 (0 で制限なし)
+    max_per_host: int = 0
+    # ホストごとの同時リクエスト数を応答時間とエラーから自動調整する
+    # 上限は max_per_host（0 の場合は concurrency）
+    adaptive: bool = False
+    # ホストごとのリクエストレート上限（件/秒、0 で制限なし）
+    rate_limit: float = 0.0
+    # レート制限時に連続して送れるリクエスト数
+    burst: int = 1
+    # リクエスト間隔（秒）。rate_limit 未指定時にホストごとのレート上限として使う
     delay: float = 0.0
+    # DNS キャッシュの有効期間（秒）
+    dns_cache_ttl: int = 300
+    # keep-alive 接続の保持時間（秒）
+    keepalive_timeout: float = 30.0
+    # ページ本文の最大読み込みサイズ（バイト、0 で無制限）
+    # 上限を超えるページは上限までの内容からリンクを抽出する
+    max_body_size: int = 5 * 1024 * 1024
+    # 起点URLのパス以下に対応づけるビルド済みサイトのディレクトリ（空文字で無効）
+    # 指定時はディレクトリ内のページをファイルから読み込み、外部リンクだけを HTTP でチェックする
+    local_root: str = ""
     # リンク切れ判定ステータスコード
     error_codes: List[int] = field(default_factory=list)
+    # 一時的な失敗（通信エラー、タイムアウト、retry_statuses）の再試行回数
+    retries: int = 2
+    # 再試行の待ち時間の基準（秒）。n 回目は 0〜retry_backoff * 2^(n-1) 秒のランダムな時間待つ
+    retry_backoff: float = 0.5
+    # 再試行の待ち時間の上限（秒）
+    retry_max_backoff: float = 30.0
+    # 再試行するHTTPステータスコード
+    retry_statuses: List[int] = field(default_factory=lambda: [429, 500, 502, 503, 504])
+    # チェックポイントを保存する状態ファイル（空文字で保存しない）
+    state_file: str = ""
+    # 状態ファイルの内容から前回の続きを再開
+    resume: bool = False
+    # チェックポイントの保存間隔（秒）
+    checkpoint_interval: float = 60.0
+    # インクリメンタルクロール用のページ情報ファイル（空文字で無効）
+    incremental_db: str = ""
+    # 内容が同じページの判定（空文字で無効）: "exact" は本文が一致するページ、
+    # "near" は SimHash のハミング距離が dedup_distance 以下のページを同じ内容と見なし、
+    # 処理済みのページの抽出結果を再利用してそのページから抽出済みのリンクをチェックしない
+    content_dedup: str = ""
+    # near で同じ内容と見なすハミング距離（64 ビット中）
+    dedup_distance: int = 3
+    # ナビゲーション・ヘッダー・フッター・サイドバー (nav, header, footer, aside) を除いて比較する
+    dedup_ignore_boilerplate: bool = False
+    # 実行をまたいで共有するリンク判定キャッシュのファイル（空文字で無効）
+    verdict_cache: str = ""
+    # 判定キャッシュの最大件数（超過分は最終利用が古いものから削除）
+    cache_max_entries: int = 100000
+    # 判定キャッシュのうちメモリ上に保持する件数
+    cache_memory_entries: int = 10000
+    # 判定キャッシュの有効期間（秒）: 正常 / リンク切れ / 通信エラー
+    cache_ttl_ok: float = 7 * 86400
+    cache_ttl_broken: float = 3600
+    cache_ttl_error: float = 600
+    # 終了時に計測値を OpenMetrics テキスト形式で書き出すファイル（空文字で無効）
+    metrics_file: str = ""
+    # 終了時に計測値の集計を JSON で書き出すファイル（空文字で無効）
+    metrics_json: str = ""
+    # クロール中に計測値を http://127.0.0.1:<port>/metrics で公開する（0 で無効）
+    metrics_port: int = 0
+    # cProfile のプロファイルを書き出すファイル（空文字で無効）
+    # 同じ名前に .tracemalloc.txt を付けたファイルにメモリ割り当ての多い箇所を書き出す
+    profile: str = ""
+    # リンク切れの結果だけを保持し、それ以外は件数のみ数える
+    broken_only: bool = False
     # 中断フラグ
     cancel_event: threading.Event = field(default_factory=threading.Event)
\ No newline at end of file
@@ -1,25 +1,48 @@
 import asyncio
-from typing import Optional, Callable
-from urllib.parse import urlparse, urljoin
+import codecs
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Collection, Optional, Callable
+from urllib.parse import urljoin, urlparse
 
 import aiohttp
-from bs4 import BeautifulSoup
 
+from .cache import VerdictCache
+from .canonical import TRACKING_PARAMS, UrlCanonicalizer
 from .config import Config
+from .dedup import ContentIndex, fingerprint
+from .extractor import extract_links, extract_urls, get_extractor, resolve_links, tag_attrs_for
+from .frontier import Frontier
+from .localfs import SiteIndex, extract_file_urls, is_html_file, read_html
+from .metrics import CrawlMetrics, Profiler, serve_metrics
+from .results import LinkResult, ResultQueue, ResultSink, ResultStore
+from .scheduler import HostScheduler, Slot
+from .scope import ScopeFilter
+from .sitemap import SitemapParser, parse_robots
+from .state import CrawlState, PageStore
+from .urlset import FingerprintDict, FingerprintSet, container_memory
 
-
-class LinkResult:
-    """
-    リンクチェック結果を表す。
-    """
-    def __init__(self, source: str, target: str,
-                 status: Optional[int], error: Optional[str],
-                 is_broken: bool):
-        self.source = source
-        self.target = target
-        self.status = status
-        self.error = error
-        self.is_broken = is_broken
+# 本文を読み込んでリンクを抽出する Content-Type（ヘッダがない場合も読み込む）
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+# 本文読み込みのチャンクサイズ（バイト）
+CHUNK_SIZE = 64 * 1024
+# HEAD を受け付けないサーバーが返すステータス（GET で確認し直す）
+HEAD_REJECTED_STATUSES = {403, 405, 501}
+# HEAD 未対応を示すステータス。返したホストには以後 HEAD を送らない
+HEAD_UNSUPPORTED_STATUSES = {405, 501}
+# 本文を受け取らずにステータスだけを得るための GET の Range ヘッダ
+PROBE_HEADERS = {"Range": "bytes=0-0"}
+# 1回のクロールで読み込むサイトマップの最大数（インデックスの循環参照対策を兼ねる）
+MAX_SITEMAPS = 1000
+# 再試行する通信エラー（接続失敗・切断・DNS 解決失敗・タイムアウト・本文の途中切断）
+RETRYABLE_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError)
+# キューの長さなどのゲージの最大値を記録する間隔（秒）
+METRICS_SAMPLE_INTERVAL = 1.0
 
 
 class LinkChecker:
@@ -27,152 +50,949 @@ class LinkChecker:
     リンク切れチェックのコアロジック。
     """
     def __init__(self, config: Config,
-                 progress_callback: Optional[Callable[[int, int, str], None]] = None):
+                 progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                 sinks: Optional[list[ResultSink]] = None):
         self.config = config
         self.progress_callback = progress_callback
+        # 結果を逐次受け取る出力先
+        self.sinks = list(sinks or [])
+        # 重複判定のキーには正規化したURLを使い、レポートには元のURLを残す
+        strip_params = list(config.strip_params)
+        if config.strip_tracking_params:
+            strip_params += TRACKING_PARAMS
+        self._canonicalizer = UrlCanonicalizer(config.sort_query, strip_params,
+                                               config.ignore_path_case)
         self._visited = set()
-        self._results: list[LinkResult] = []
+        self._results = ResultStore(config.broken_only)
         # キャッシュ: 同一リンクの重複チェック防止
-        self._link_cache: dict[str, tuple[Optional[int], Optional[str], bool]] = {}
-        # 起点URLホストとパスプレフィックスを記録
-        parsed_start = urlparse(config.start_url)
-        self._start_host = parsed_start.netloc
-        # サブディレクトリ制限: 起点URLパス以下を対象
-        prefix = parsed_start.path
-        if not prefix.endswith('/'):
-            prefix += '/'
-        self._start_prefix = prefix
-        self._semaphore = asyncio.Semaphore(config.concurrency)
-        self._count_errors = 0
+        # (status, error, is_broken, リクエスト回数, 応答時間)
+        self._link_cache: dict[str, tuple[Optional[int], Optional[str], bool,
+                                          int, Optional[float]]] = {}
+        if config.compact_urls:
+            spill_dir = config.url_table_dir or None
+            self._visited = FingerprintSet(spill_dir=spill_dir)
+            self._link_cache = FingerprintDict(spill_dir=spill_dir)
+        # クロール予定ページ・チェック中のリンクの結果を待っている (リンク元, リンク先)
+        self._waiting: dict[str, list[tuple[str, str]]] = {}
+        # チェック中（再試行待ちを含む）のリンク
+        self._checking: set[str] = set()
+        self._retry_statuses = set(config.retry_statuses)
+        # ローカルディレクトリモードのファイル一覧
+        self._local: Optional[SiteIndex] = None
+        # HEAD を受け付けないことが分かったホスト（以後は最初から GET で確認する）
+        self._get_only_hosts: set[str] = set()
+        # 起点URLホストを記録
+        self._start_host = urlparse(config.start_url).netloc
+        # 処理段階ごとの所要時間、キャッシュのヒット率、キューの長さなどの計測値
+        self.metrics = CrawlMetrics()
+        # クロール範囲（ホスト、起点URLパス以下、除外・包含パターン、robots.txt）の判定
+        self._scope = ScopeFilter(config.start_url, config.same_origin,
+                                  config.include_subdomains, config.exclude, config.include)
+        # リクエスト間隔 delay はホストごとのレート上限として扱う
+        rate = config.rate_limit
+        if rate <= 0 and config.delay > 0:
+            rate = 1.0 / config.delay
+        self._scheduler = HostScheduler(config.concurrency, config.max_per_host,
+                                        rate, config.burst, config.adaptive,
+                                        self._on_adjust, self.metrics)
+        self._count_pages = 0
+        self._tag_attrs = tag_attrs_for(config.check_resources)
+        # バックエンドの依存ライブラリを起動時に確認する
+        get_extractor(config.parser, self._tag_attrs)
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._parse_workers = 0
+        # 内容が同じページの判定: 処理済みページのフィンガープリントとリンクの抽出結果
+        self._content: Optional[ContentIndex] = None
+        if config.content_dedup:
+            self._content = ContentIndex(config.content_dedup, config.dedup_distance,
+                                         config.dedup_ignore_boilerplate)
+        # チェックポイント: 処理中のページと前回保存以降の差分
+        self._state: Optional[CrawlState] = None
+        # インクリメンタルクロール: 前回実行時のページ検証子と抽出リンク
+        self._pages: Optional[PageStore] = None
+        # 実行をまたいで共有するリンク判定キャッシュ
+        self._verdicts: Optional[VerdictCache] = None
+        self._in_progress: dict[str, int] = {}
+        self._unsaved_visited: list[str] = []
+        self._unsaved_verdicts: list[str] = []
+        self._saved_results = 0
+        self._stopped = False
+        # cancel() による中断要求。同じ Config を使う他の実行には影響させない
+        self._cancel = threading.Event()
+        # サイトマップを最後まで読み込んだか（状態ファイルに保存し、再開時は読み込み直さない）
+        self._sitemaps_done = False
+        # 再開時: 前回サイトマップをリンク元として記録済みの (リンク元, リンク先)
+        self._seeded: set[tuple[str, str]] = set()
+        # 中断用: 実行中のイベントループ、キュー、ワーカータスク
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._frontier: Optional[Frontier] = None
+        self._tasks: list[asyncio.Task] = []
+        # stream() の消費側が追いつくまでクロールを待たせるためのキュー
+        self._stream: Optional[ResultQueue] = None
+        self._register_gauges()
 
     async def run(self) -> list[LinkResult]:
         timeout = aiohttp.ClientTimeout(total=self.config.timeout)
         headers = {"User-Agent": self.config.user_agent}
-        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-            await self._crawl_url(session, self.config.start_url, 0)
-        return self._results
+        connector = aiohttp.TCPConnector(
+            limit=self.config.concurrency,
+            limit_per_host=max(0, self.config.max_per_host),
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            keepalive_timeout=self.config.keepalive_timeout,
+        )
+        parse_workers = self.config.parse_workers
+        if self.config.local_root:
+            self._local = await asyncio.to_thread(SiteIndex, self.config.local_root,
+                                                  self.config.start_url)
+            # ファイルの読み込みと解析が処理の大半になるため、既定で CPU コア数のプロセスを使う
+            if parse_workers == 0:
+                parse_workers = os.cpu_count() or 1
+        if parse_workers > 0:
+            self._parse_pool = ProcessPoolExecutor(parse_workers)
+            self._parse_workers = parse_workers
+        if self.config.state_file:
+            self._state = CrawlState(self.config.state_file)
+        if self.config.incremental_db:
+            self._pages = PageStore(self.config.incremental_db)
+        if self.config.verdict_cache:
+            self._verdicts = VerdictCache(
+                self.config.verdict_cache, self.config.cache_max_entries,
+                self.config.cache_memory_entries, self.config.cache_ttl_ok,
+                self.config.cache_ttl_broken, self.config.cache_ttl_error)
+        profiler = Profiler(self.config.profile) if self.config.profile else None
+        metrics_server = None
+        try:
+            if self.config.metrics_port:
+                metrics_server = await serve_metrics(self.metrics, self.config.metrics_port)
+            if profiler is not None:
+                profiler.start()
+            async with aiohttp.ClientSession(timeout=timeout, headers=headers,
+                                             connector=connector,
+                                             trace_configs=[self.metrics.trace_config()]
+                                             ) as session:
+                await self._crawl(session)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            self._sample_metrics()
+            self.metrics.finish()
+            if self.config.metrics_file:
+                self.metrics.write_openmetrics(self.config.metrics_file)
+            if self.config.metrics_json:
+                self.metrics.write_json(self.config.metrics_json)
+            if metrics_server is not None:
+                await metrics_server.cleanup()
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(cancel_futures=True)
+                self._parse_pool = None
+            if self._state is not None:
+                self._state.close()
+                self._state = None
+            if self._pages is not None:
+                self._pages.close()
+                self._pages = None
+            if self._verdicts is not None:
+                self._verdicts.close()
+                self._verdicts = None
+        return list(self._results)
+
+    async def stream(self, maxsize: int = 1000) -> AsyncIterator[LinkResult]:
+        """
+        リンクチェック結果を記録された順に返す非同期イテレータ。
+        未消費の結果が maxsize 件たまると、消費されるまでクロールを待たせる。
+        イテレーションを途中で抜けるとクロールを中断する。
+
+            async for result in checker.stream():
+                ...
+        """
+        queue = ResultQueue(maxsize)
+        self._stream = queue
+        self.sinks.append(queue)
+        task = asyncio.create_task(self.run())
+        task.add_done_callback(lambda _: queue.close())
+        try:
+            while True:
+                result = await queue.get()
+                if result is None:
+                    break
+                yield result
+            await task
+        finally:
+            if not task.done():
+                self.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            self.sinks.remove(queue)
+            self._stream = None
+
+    def cancel(self):
+        """
+        クロールを中断する。別スレッドからも呼び出せる。
+        実行中のリクエストを打ち切り、run() はそれまでの結果を返す。
+        """
+        self._cancel.set()
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._abort)
+
+    def _cancelled(self) -> bool:
+        # 呼び出し側が config.cancel_event で中断を要求することもできる
+        return self._cancel.is_set() or self.config.cancel_event.is_set()
+
+    def memory_usage(self) -> dict[str, dict[str, int]]:
+        """
+        訪問済みURL (visited) とリンク判定キャッシュ (verdicts) の件数とメモリ使用量（バイト）。
+        mapped は compact_urls で一時ファイルに対応づけた分。
+        """
+        usage = {}
+        for name, table in (("visited", self._visited), ("verdicts", self._link_cache)):
+            if isinstance(table, (FingerprintSet, FingerprintDict)):
+                usage[name] = table.memory_usage()
+            else:
+                usage[name] = container_memory(table)
+        return usage
+
+    def _register_gauges(self):
+        metrics = self.metrics
+        metrics.gauge("frontier_depth", "URLs waiting in the crawl queue.",
+                      lambda: len(self._frontier) if self._frontier is not None else 0)
+        metrics.gauge("frontier_spilled", "Queued URLs spilled to the temporary file.",
+                      lambda: (len(self._frontier) - self._frontier.in_memory
+                               if self._frontier is not None else 0))
+        metrics.gauge("pages_in_progress", "Pages being processed by workers.",
+                      lambda: len(self._in_progress))
+        metrics.gauge("links_checking", "Links being checked, including retry waits.",
+                      lambda: len(self._checking))
+        metrics.gauge("links_waiting", "Link targets waiting for a pending page or check.",
+                      lambda: len(self._waiting))
+        metrics.gauge("in_flight", "Requests in flight per host.",
+                      self._scheduler.in_flight, label="host")
+        if self.config.adaptive:
+            metrics.gauge("concurrency_limit", "Adaptive concurrency limit per host.",
+                          self._scheduler.limits, label="host")
+
+    def _sample_metrics(self):
+        # lru_cache の統計をクロール範囲判定のキャッシュのヒット数として記録する
+        info = self._scope.allowed.cache_info()
+        self.metrics.caches["scope"] = [info.hits, info.misses]
+        self.metrics.sample()
+
+    async def _metrics_loop(self):
+        while True:
+            await asyncio.sleep(METRICS_SAMPLE_INTERVAL)
+            self._sample_metrics()
+
+    def _abort(self):
+        if self._frontier is None:
+            return
+        self._stop(self._frontier)
+        for task in self._tasks:
+            task.cancel()
+
+    async def _crawl(self, session: aiohttp.ClientSession):
+        frontier = Frontier(self.config.frontier_size)
+        restored = self._state is not None and self._restore_state(frontier)
+        # シャードに分けたクロールでは起点URLを担当するシャードだけがクロールを始める
+        start_key = self._canonicalizer.canonicalize(self.config.start_url)
+        owns_start = self._owns(start_key)
+        if not restored and owns_start:
+            self._visit(start_key)
+            frontier.put(self.config.start_url, 0)
+        # robots.txt の Disallow はクロール開始前に読み込んでおく
+        sitemaps = []
+        if self.config.respect_robots or (self.config.sitemap and not self.config.sitemap_urls):
+            sitemaps = await self._load_robots(session)
+        # 固定数のワーカーがキューからページを取り出して処理する
+        # ローカルディレクトリモードでは解析プロセスをすべて使えるだけのワーカーを動かす
+        count = self.config.concurrency
+        if self._local is not None:
+            count = max(count, self._parse_workers)
+        workers = [asyncio.create_task(self._worker(session, frontier))
+                   for _ in range(max(1, count))]
+        if self._state is not None:
+            workers.append(asyncio.create_task(self._checkpoint_loop(frontier)))
+        workers.append(asyncio.create_task(self._metrics_loop()))
+        seeder = None
+        if ((self.config.sitemap or self.config.sitemap_urls) and owns_start
+                and not self._sitemaps_done):
+            if self.config.sitemap_urls:
+                sitemaps = list(self.config.sitemap_urls)
+            elif not sitemaps:
+                sitemaps = [urljoin(self.config.start_url, "/sitemap.xml")]
+            seeder = asyncio.create_task(self._seed_from_sitemaps(session, frontier, sitemaps))
+            workers.append(seeder)
+        self._loop = asyncio.get_running_loop()
+        self._frontier = frontier
+        self._tasks = workers
+        # run() の開始前に中断要求があった場合
+        if self._cancelled():
+            self._abort()
+        try:
+            await self._until_done(session, frontier, seeder)
+        finally:
+            # 処理中のページが残っているうちに保存する（中断時はキューを破棄する前に保存済み）
+            if self._state is not None and not self._stopped:
+                self._save_state(frontier)
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._loop = None
+            self._frontier = None
+            self._tasks = []
+
+    async def _until_done(self, session: aiohttp.ClientSession, frontier: Frontier,
+                          seeder: Optional[asyncio.Task]):
+        """
+        クロール待ちのページと、サイトマップの読み込みがすべて終わるまで待つ。
+        """
+        # サイトマップを読み終えるまではキューが空になっても終了しない
+        if seeder is not None:
+            await self._wait(seeder)
+        await self._wait(frontier.join())
+
+    async def _wait(self, aw: Awaitable):
+        """
+        aw の完了を待つ。その間に例外で終了したタスクがあれば、その例外を送出する。
+        ワーカーがすべて終了してキューが空にならないまま待ち続けることを防ぐ。
+        """
+        waiter = asyncio.ensure_future(aw)
+        pending = {task for task in self._tasks if task is not waiter}
+        try:
+            while not waiter.done():
+                done, _ = await asyncio.wait({waiter, *pending},
+                                             return_when=asyncio.FIRST_COMPLETED)
+                pending -= done
+                self._raise_task_error()
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        self._raise_task_error()
+
+    def _raise_task_error(self):
+        """
+        例外で終了したワーカーなどのタスクがあれば、その例外を送出する。
+        """
+        for task in self._tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    async def _load_robots(self, session: aiohttp.ClientSession) -> list[str]:
+        """
+        起点ホストの robots.txt を読み込み、記載されたサイトマップのURLを返す。
+        respect_robots の場合は Disallow と Crawl-delay / Request-rate を以後のクロールに適用する。
+        """
+        url = urljoin(self.config.start_url, "/robots.txt")
+
+        async def send(slot: Slot):
+            async with session.get(url) as resp:
+                slot.response(resp.status, resp.headers.get("Retry-After"))
+                if resp.status != 200:
+                    return None
+                return await resp.text(errors="replace")
+
+        text, status, error, _, _ = await self._request(url, send)
+        if text is None:
+            self._report_progress(f"[robots] {url}: {error or f'HTTP {status}'}")
+            return []
+        robots = parse_robots(text)
+        if self.config.respect_robots:
+            self._scope.set_robots(robots, self.config.user_agent)
+            agent = self.config.user_agent
+            rates = []
+            delay = robots.crawl_delay(agent)
+            if delay:
+                rates.append(1.0 / float(delay))
+            request_rate = robots.request_rate(agent)
+            if request_rate and request_rate.seconds:
+                rates.append(request_rate.requests / request_rate.seconds)
+            if rates:
+                self._scheduler.limit_rate(self._start_host, min(rates))
+        return robots.site_maps() or []
+
+    async def _seed_from_sitemaps(self, session: aiohttp.ClientSession, frontier: Frontier,
+                                  sitemaps: list[str]):
+        """
+        サイトマップ（インデックスから参照されるものを含む）を読み込みながら、
+        載っているページをクロール待ちキューに追加する。
+        ページのリンク判定はサイトマップをリンク元として記録する。
+        """
+        pending = deque(sitemaps)
+        seen = set(sitemaps)
+        while pending and not self._cancelled():
+            sitemap = pending.popleft()
+            count = 0
+            # このサイトマップから処理済みのURL（再試行で先頭から読み直しても重ねて追加しない）
+            added: set[str] = set()
+
+            def add(entries: list[tuple[str, str]]):
+                nonlocal count
+                for kind, loc in entries:
+                    if kind == "sitemap":
+                        loc = urljoin(sitemap, loc)
+                        if loc not in seen and len(seen) < MAX_SITEMAPS:
+                            seen.add(loc)
+                            pending.append(loc)
+                        continue
+                    if loc in added:
+                        continue
+                    added.add(loc)
+                    if (sitemap, loc) in self._seeded:
+                        # 前回の実行で記録済み
+                        count += 1
+                    elif self._is_allowed(loc):
+                        count += 1
+                        self._enqueue_page(sitemap, loc, self._canonicalizer.canonicalize(loc),
+                                           0, frontier)
+
+            async def send(slot: Slot):
+                async with session.get(sitemap) as resp:
+                    slot.response(resp.status, resp.headers.get("Retry-After"))
+                    if self._is_broken_status(resp.status):
+                        return
+                    parser = SitemapParser()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        add(parser.feed(chunk))
+                    add(parser.close())
+
+            _, status, error, _, _ = await self._request(sitemap, send)
+            if error is not None or self._is_broken_status(status):
+                self._report_progress(f"[sitemap] {sitemap}: {error or f'HTTP {status}'}")
+            else:
+                self._report_progress(f"[sitemap] {sitemap}: {count} URLs")
+        if not self._cancelled():
+            self._sitemaps_done = True
+            self._seeded = set()
+
+    async def _worker(self, session: aiohttp.ClientSession, frontier: Frontier):
+        while True:
+            item = await frontier.get()
+            if item is None:
+                return
+            url, depth = item
+            self._in_progress[url] = depth
+            try:
+                await self._wait_for_consumer()
+                if not self._cancelled():
+                    with self.metrics.time("page"):
+                        await self._crawl_url(session, url, depth, frontier)
+                # 中断時はリンクチェックが打ち切られている可能性があるため処理中のまま残す
+                if self._cancelled():
+                    self._stop(frontier)
+                else:
+                    del self._in_progress[url]
+            finally:
+                frontier.task_done()
+
+    async def _wait_for_consumer(self):
+        if self._stream is not None and not self._stream.not_full.is_set():
+            with self.metrics.time("consumer_wait"):
+                await self._stream.not_full.wait()
+
+    def _stop(self, frontier: Frontier):
+        """
+        中断要求を受けて残りのキューを破棄する。チェックポイントがあれば先に保存する。
+        """
+        if self._stopped:
+            return
+        if self._state is not None:
+            self._save_state(frontier)
+        self._stopped = True
+        frontier.close()
+
+    async def _checkpoint_loop(self, frontier: Frontier):
+        while True:
+            await asyncio.sleep(self.config.checkpoint_interval)
+            self._save_state(frontier)
+
+    def _save_state(self, frontier: Frontier):
+        """
+        キュー・処理中ページ・保留中リンクと、前回保存以降の訪問済みURL、
+        リンク判定、チェック結果を状態ファイルに書き込む。
+        """
+        pending = [(url, depth, 0) for url, depth in frontier.snapshot()]
+        pending += [(url, depth, 1) for url, depth in self._in_progress.items()]
+        verdicts = [(key, *self._link_cache[key][:3]) for key in self._unsaved_verdicts]
+        results = [(r.source, r.target, r.status, r.error, r.is_broken, r.attempts, r.latency)
+                   for r in self._results.iter_from(self._saved_results)]
+        waiting = [(key, source, target)
+                   for key, items in self._waiting.items() for source, target in items]
+        counters = {"pages": self._count_pages, "checked": self._results.total,
+                    "broken": self._results.broken, "sitemaps_done": int(self._sitemaps_done)}
+        self._state.save(self._unsaved_visited, verdicts, results, pending, waiting, counters)
+        self._unsaved_visited = []
+        self._unsaved_verdicts = []
+        self._saved_results = len(self._results)
+
+    def _restore_state(self, frontier: Frontier) -> bool:
+        """
+        状態ファイルから前回の続きを読み込む。再開する状態がなければ False。
+        """
+        if not self._state.begin(self.config.start_url, self.config.resume):
+            return False
+        self._state.discard_partial_pages()
+        self._visited.update(self._state.visited())
+        for key, status, error, is_broken in self._state.verdicts():
+            self._link_cache[key] = (status, error, bool(is_broken), 0, None)
+        self._sitemaps_done = self._state.get_meta("sitemaps_done") == "1"
+        # サイトマップの途中で中断した場合は読み込み直すため、記録済みの組を覚えておく。
+        # ページ以外（訪問済みでないURL）がリンク元の組がサイトマップからの記録
+        reseed = ((self.config.sitemap or bool(self.config.sitemap_urls))
+                  and not self._sitemaps_done)
+        page_sources: dict[str, bool] = {}
+
+        def from_sitemap(source: str) -> bool:
+            if not reseed:
+                return False
+            is_page = page_sources.get(source)
+            if is_page is None:
+                is_page = page_sources[source] = (
+                    self._canonicalizer.canonicalize(source) in self._visited)
+            return not is_page
+
+        for source, target, status, error, is_broken, attempts, latency in self._state.results():
+            if from_sitemap(source):
+                self._seeded.add((source, target))
+            result = LinkResult(source, target, status, error, bool(is_broken),
+                                attempts, latency)
+            self._results.add(result)
+            # 前回までの結果もレポートに含める
+            for sink in self.sinks:
+                sink.add(result)
+        self._saved_results = len(self._results)
+        # 途中で中断したページの結果は破棄済みのため、件数は保存値より少なくなりうる
+        self._results.total = max(self._results.total,
+                                  int(self._state.get_meta("checked") or 0))
+        for key, source, target in self._state.waiting():
+            if from_sitemap(source):
+                self._seeded.add((source, target))
+            self._waiting.setdefault(key, []).append((source, target))
+        for url, depth in self._state.frontier():
+            frontier.put(url, depth)
+        self._count_pages = int(self._state.get_meta("pages") or 0)
+        return True
+
+    def _visit(self, key: str):
+        self._visited.add(key)
+        if self._state is not None:
+            self._unsaved_visited.append(key)
+
+    def _cache_verdict(self, key: str, status: Optional[int], error: Optional[str],
+                       is_broken: bool, attempts: int = 0, latency: Optional[float] = None,
+                       fresh: bool = True):
+        """
+        リンク判定をキャッシュする。fresh はこの実行でリクエストした結果であることを示し、
+        実行をまたぐキャッシュにも保存する。
+        """
+        self._link_cache[key] = (status, error, is_broken, attempts, latency)
+        if self._state is not None:
+            self._unsaved_verdicts.append(key)
+        if fresh and self._verdicts is not None:
+            self._verdicts.put(key, status, error, is_broken)
 
     def _report_progress(self, current: str):
         if self.progress_callback:
-            pages = len(self._visited)
-            errors = self._count_errors
+            pages = self._count_pages
+            errors = self._results.broken
             self.progress_callback(pages, errors, current)
 
+    def _on_adjust(self, host: str, message: str):
+        # 同時リクエスト数の自動調整を進捗として通知
+        self._report_progress(f"[concurrency] {host}: {message}")
+
     def _is_allowed(self, url: str) -> bool:
-        parsed = urlparse(url)
-        netloc = parsed.netloc
-        if self.config.include_subdomains:
-            if not (netloc == self._start_host or netloc.endswith("." + self._start_host)):
-                return False
-        elif self.config.same_origin:
-            if netloc != self._start_host:
-                return False
-        # サブディレクトリ制限: 起点URLパス以下のみ許可
-        if not parsed.path.startswith(self._start_prefix):
-            return False
-        if self.config.exclude and any(p in url for p in self.config.exclude):
-            return False
-        if self.config.include and not any(p in url for p in self.config.include):
-            return False
+        return self._scope.allowed(url)
+
+    def _owns(self, key: str) -> bool:
+        """
+        正規化したURL key の取得・チェックをこのチェッカーが担当するか。
+        シャードに分けたクロールでは担当外のリンクを _forward で担当のシャードに送る。
+        """
         return True
 
-    async def _crawl_url(self, session: aiohttp.ClientSession, url: str, depth: int):
-        if self.config.cancel_event.is_set():
-            return
-        # 最大深度: max_depth < 0 の場合は無制限
-        if self.config.max_depth >= 0 and depth > self.config.max_depth:
+    def _forward(self, source: str, link: str, key: str, depth: Optional[int]):
+        """
+        担当外のリンクを担当のシャードに送る。depth はクロールするページの深度、
+        チェックだけ行うリンクは None。単独のクロールではすべて担当するため何もしない。
+        """
+
+    async def _crawl_url(self, session: aiohttp.ClientSession, url: str, depth: int,
+                         frontier: Frontier):
+        """
+        ページを1回のGETで取得し、そのステータスをリンク判定として記録した上で
+        本文からリンクを抽出する。子ページはクロール待ちキューに追加し、
+        それ以外のリンク（リソース、最大深度を超えるページ）は HEAD でチェックする。
+        """
+        if self._local is not None and self._local.contains(url):
+            await self._crawl_file(session, url, depth, frontier)
             return
-        if url in self._visited:
+        key = self._canonicalizer.canonicalize(url)
+        # インクリメンタルクロール: 前回の検証子があれば条件付きリクエストにする
+        stored = self._pages.get(key) if self._pages is not None else None
+        headers = {}
+        if stored is not None:
+            if stored[0]:
+                headers["If-None-Match"] = stored[0]
+            if stored[1]:
+                headers["If-Modified-Since"] = stored[1]
+
+        async def send(slot: Slot):
+            async with session.get(url, headers=headers) as resp:
+                slot.response(resp.status, resp.headers.get("Retry-After"))
+                if resp.status == 304 and stored is not None:
+                    # 前回から変更なし: 保存済みのリンクを再利用する
+                    self.metrics.count("pages_not_modified")
+                    return None, stored[2], (None, None)
+                # エラーのステータスのページも本文からリンクを抽出する
+                with self.metrics.time("body"):
+                    body = await self._read_body(resp)
+                if self._is_broken_status(resp.status):
+                    # 次回の条件付きリクエストで 304 を正常と見なさないよう検証子は保存しない
+                    return body, None, (None, None)
+                return (body, None,
+                        (resp.headers.get("ETag"), resp.headers.get("Last-Modified")))
+
+        page, status, error, attempts, latency = await self._request(url, send)
+        html, extracted, validators = page or (None, None, (None, None))
+        if status == 304 and extracted is not None:
+            # 変更なし: 保存したのは正常に取得できたページなので、リンク判定は 200 とする
+            status = 200
+        is_broken = error is not None or self._is_broken_status(status)
+        self._cache_verdict(key, status, error, is_broken, attempts, latency)
+        # このページの取得結果を待っていたリンク元に結果を記録
+        for source, target in self._waiting.pop(key, ()):
+            self._record(source, target, *self._link_cache[key])
+        if html is None and extracted is None:
+            if stored is not None:
+                self._pages.delete(key)
             return
-        self._visited.add(url)
-        await asyncio.sleep(self.config.delay)
-        try:
-            async with self._semaphore:
-                async with session.get(url) as resp:
-                    html = await resp.text()
-        except Exception:
+        self._count_pages += 1
+        self.metrics.count("pages")
+
+        skip = ()
+        if extracted is None:
+            extracted, skip = await self._extract(html, url)
+            if self._pages is not None:
+                if any(validators):
+                    self._pages.put(key, *validators, extracted)
+                elif stored is not None:
+                    self._pages.delete(key)
+        await self._process_links(session, url, depth, extracted, frontier, skip)
+
+    async def _crawl_file(self, session: aiohttp.ClientSession, url: str, depth: int,
+                          frontier: Frontier):
+        """
+        ローカルディレクトリモードで、ページをファイルから読み込んでリンクを抽出する。
+        ファイルが存在すれば 200、なければ 404 として記録する。
+        """
+        key = self._canonicalizer.canonicalize(url)
+        found = self._local.resolve(url)
+        status = 200 if found is not None else 404
+        # ファイルは実行のたびに変わるため実行をまたぐキャッシュには保存しない
+        self._cache_verdict(key, status, None, self._is_broken_status(status), fresh=False)
+        for source, target in self._waiting.pop(key, ()):
+            self._record(source, target, *self._link_cache[key])
+        if found is None or not is_html_file(found[0]):
             return
+        path, base_url = found
+        self._count_pages += 1
+        self.metrics.count("pages")
+        skip = ()
+        if self._content is not None:
+            # 内容を比較するため、ファイルはこのプロセスで読み込む
+            html = await asyncio.to_thread(read_html, path, self.config.max_body_size)
+            extracted, skip = await self._extract(html, base_url)
+        else:
+            # ローカルディレクトリモードではファイルの読み込みも含む
+            with self.metrics.time("parse"):
+                extracted = await self._in_parse_pool(
+                    extract_file_urls, path, base_url, self.config.parser, self._tag_attrs,
+                    self.config.max_body_size)
+        await self._process_links(session, url, depth, extracted, frontier, skip)
 
-        try:
-            soup = BeautifulSoup(html, "html.parser")
-        except Exception:
-            soup = BeautifulSoup(html, "lxml")
+    async def _in_parse_pool(self, func: Callable, *args):
+        """
+        解析のプロセスプールがあれば func を別プロセスで実行し、その間もイベントループを止めない。
+        """
+        if self._parse_pool is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parse_pool, func, *args)
 
-        tag_attrs = [("a", "href")]
-        if self.config.check_resources:
-            tag_attrs += [("img", "src"), ("link", "href"), ("script", "src")]
+    async def _extract(self, html: str, url: str
+                       ) -> tuple[list[tuple[str, str]], Collection[str]]:
+        """
+        ページから (絶対URL, タグ名) のリストを抽出する。
+        内容が同じページを処理済みであれば解析せずにその抽出結果を url で解決し直して使い、
+        処理済みのページから抽出したリンク (このページでチェックしなくてよいリンク) も返す。
+        """
+        if self._content is None:
+            with self.metrics.time("parse"):
+                extracted = await self._in_parse_pool(
+                    extract_urls, html, url, self.config.parser, self._tag_attrs)
+            return extracted, ()
+        content = self._content
+        with self.metrics.time("dedup"):
+            if content.mode == "exact":
+                fp = content.fingerprint(html)
+            else:
+                fp = await self._in_parse_pool(fingerprint, html, content.mode,
+                                               content.ignore_boilerplate)
+            match = content.find(fp)
+        self.metrics.cache("content", match is not None)
+        if match is not None:
+            original, links = match
+            self.metrics.count("pages_duplicate")
+            for sink in self.sinks:
+                sink.add_duplicate(url, original)
+            skip = {absl for absl, _ in resolve_links(links, original)}
+            return resolve_links(links, url), skip
+        with self.metrics.time("parse"):
+            links = await self._in_parse_pool(extract_links, html, self.config.parser,
+                                              self._tag_attrs)
+        content.add(fp, url, links)
+        return resolve_links(links, url), ()
 
+    async def _process_links(self, session: aiohttp.ClientSession, url: str, depth: int,
+                             extracted: list[tuple[str, str]], frontier: Frontier,
+                             skip: Collection[str] = ()):
+        """
+        ページから抽出したリンクのうち、子ページはクロール待ちキューに追加し、
+        それ以外のリンクはチェックする。skip のリンクは除く。
+        """
         seen = set()
-        all_links: list[tuple[str, str]] = []
-        for tag, attr in tag_attrs:
-            for elem in soup.find_all(tag):
-                raw = elem.get(attr)
-                if not raw or raw.startswith("#"):
-                    continue
-                absl = urljoin(url, raw)
-                if not self._is_allowed(absl):
-                    continue
-                if absl in seen:
-                    continue
-                seen.add(absl)
-                all_links.append((absl, tag))
-
-        check_coros = [self._check_link(session, url, link) for link, _ in all_links]
-        child_coros = [self._crawl_url(session, link, depth + 1)
-                      for link, tag in all_links if tag == "a"]
+        all_links: list[tuple[str, str, str]] = []
+        allowed = self._scope.allowed
+        for absl, tag in extracted:
+            if absl in skip or not allowed(absl):
+                continue
+            key = self._canonicalizer.canonicalize(absl)
+            if key in seen:
+                continue
+            seen.add(key)
+            all_links.append((absl, key, tag))
+
+        # 最大深度: max_depth < 0 の場合は無制限
+        crawl_children = self.config.max_depth < 0 or depth + 1 <= self.config.max_depth
+        check_coros = []
+        for link, key, tag in all_links:
+            if tag == "a" and crawl_children:
+                self._enqueue_page(url, link, key, depth + 1, frontier)
+            else:
+                check_coros.append(self._check_link(session, url, link, key))
         if check_coros:
             await asyncio.gather(*check_coros)
-        if child_coros:
-            await asyncio.gather(*child_coros)
+
+    async def _request(self, url: str, send: Callable[[Slot], Awaitable[Any]]
+                       ) -> tuple[Any, Optional[int], Optional[str], int, Optional[float]]:
+        """
+        実行枠を確保して send(slot) でリクエストを送る。通信エラーと retry_statuses の
+        ステータスは、枠を解放した上で指数バックオフ（ランダムに分散）して再試行する。
+        (send の戻り値, status, error, リクエスト回数, 最後の応答時間) を返す。
+        """
+        attempts = 0
+        while True:
+            attempts += 1
+            value = status = error = latency = retry_after = None
+            retryable = False
+            try:
+                async with self._scheduler.slot(url) as slot:
+                    started = time.monotonic()
+                    try:
+                        value = await send(slot)
+                    finally:
+                        latency = time.monotonic() - started
+                status = slot.status
+                retry_after = slot.retry_after
+                retryable = status in self._retry_statuses
+            except RETRYABLE_ERRORS as e:
+                error = str(e)
+                retryable = True
+            except Exception as e:
+                error = str(e)
+            self.metrics.count("requests")
+            self.metrics.response(status)
+            if (not retryable or attempts > self.config.retries
+                    or self._cancelled()):
+                return value, status, error, attempts, latency
+            self.metrics.count("retries")
+            with self.metrics.time("backoff"):
+                await asyncio.sleep(self._backoff(attempts, retry_after))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # 同時に失敗したリクエストの再試行が重ならないよう 0〜上限の一様乱数で待つ
+        limit = self.config.retry_max_backoff
+        delay = random.uniform(0, min(limit, self.config.retry_backoff * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, limit))
+        return delay
+
+    async def _read_body(self, resp: aiohttp.ClientResponse) -> Optional[str]:
+        """
+        HTML レスポンスの本文をチャンク単位で読み込む。
+        HTML 以外の場合は読み込まずに None を返す。
+        上限を超える本文は Content-Length の有無によらず上限までの内容を返す。
+        本文の途中切断などの通信エラーは送出し、_request で再試行させる。
+        """
+        if ("Content-Type" in resp.headers
+                and resp.content_type not in HTML_CONTENT_TYPES):
+            return None
+        limit = self.config.max_body_size
+        chunks = []
+        size = 0
+        try:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if limit > 0 and size >= limit:
+                    break
+        finally:
+            self.metrics.count("body_bytes", size)
+        body = b"".join(chunks)
+        if limit > 0:
+            body = body[:limit]
+        charset = resp.charset or "utf-8"
+        try:
+            codecs.lookup(charset)
+        except LookupError:
+            # 未知の charset は UTF-8 として読む
+            charset = "utf-8"
+        return body.decode(charset, errors="replace")
+
+    def _enqueue_page(self, source: str, link: str, key: str, depth: int,
+                      frontier: Frontier):
+        """
+        子ページをクロール待ちキューに追加する。
+        リンク判定はページ取得時の結果を使い、未取得ならそれまで保留する。
+        """
+        if self._cancelled():
+            return
+        if not self._owns(key):
+            self._forward(source, link, key, depth)
+            return
+        cached = self._link_cache.get(key)
+        self.metrics.cache("links", cached is not None)
+        if cached is not None:
+            self._record(source, link, *cached)
+        else:
+            self._waiting.setdefault(key, []).append((source, link))
+        if key not in self._visited:
+            self._visit(key)
+            frontier.put(link, depth)
 
     async def _check_link(self, session: aiohttp.ClientSession,
-                          source: str, link: str):
+                          source: str, link: str, key: str):
         """
         単一リンクのステータスをチェックし、結果を記録。
-        既にチェック済みのリンクはキャッシュ結果を再利用。
+        既にチェック済みのリンクはキャッシュ結果を再利用し、
+        クロール予定のページはそのGET結果を待つ。
         """
         # 中断判定
-        if self.config.cancel_event.is_set():
+        if self._cancelled():
+            return
+        if not self._owns(key):
+            self._forward(source, link, key, None)
             return
-        # リクエスト間隔
-        await asyncio.sleep(self.config.delay)
         # キャッシュがあれば再利用
-        if link in self._link_cache:
-            status, error, is_broken = self._link_cache[link]
-            # キャッシュ再利用時もエラー件数には含める
-            if is_broken:
-                self._count_errors += 1
-        else:
-            status: Optional[int] = None
-            error: Optional[str] = None
-            is_broken = False
-            try:
-                async with self._semaphore:
-                    # HEAD リクエストでチェック
-                    try:
-                        resp = await session.head(link, allow_redirects=True)
-                    except Exception:
-                        resp = await session.get(link, allow_redirects=True)
-                    status = resp.status
-                    await resp.release()
-                # broken 判定
-                if status is not None and (status >= 400 or status in self.config.error_codes):
-                    is_broken = True
-                    self._count_errors += 1
-            except Exception as e:
-                error = str(e)
-                is_broken = True
-                self._count_errors += 1
-            # キャッシュ保存
-            self._link_cache[link] = (status, error, is_broken)
-        # 結果を記録
+        cached = self._link_cache.get(key)
+        self.metrics.cache("links", cached is not None)
+        if cached is not None:
+            self._record(source, link, *cached)
+            return
+        # クロール予定のページやチェック中のリンクは結果を待つ
+        if key in self._visited or key in self._checking:
+            self.metrics.count("links_coalesced")
+            self._waiting.setdefault(key, []).append((source, link))
+            return
+        # ローカルディレクトリ内のリンクはファイルの有無で判定する
+        if self._local is not None and self._local.contains(link):
+            status = 200 if self._local.resolve(link) is not None else 404
+            self._cache_verdict(key, status, None, self._is_broken_status(status), fresh=False)
+            self._record(source, link, *self._link_cache[key])
+            return
+        # 前回までの実行でチェック済みで有効期限内なら再利用
+        if self._verdicts is not None:
+            cached = self._verdicts.get(key)
+            self.metrics.cache("verdict_cache", cached is not None)
+            if cached is not None:
+                # error_codes が前回と異なる場合があるため、broken 判定はやり直す
+                status, error, _ = cached
+                is_broken = error is not None or self._is_broken_status(status)
+                self._cache_verdict(key, status, error, is_broken, fresh=False)
+                self._record(source, link, status, error, is_broken)
+                return
+        host = urlparse(link).netloc
+
+        async def send(slot: Slot):
+            head_status = None
+            if host not in self._get_only_hosts:
+                # HEAD リクエストでチェック
+                try:
+                    async with session.head(link, allow_redirects=True) as resp:
+                        head_status = resp.status
+                        # 拒否された場合もここで応答時間を記録し、続く GET の結果で上書きする
+                        slot.response(head_status, resp.headers.get("Retry-After"))
+                        if head_status not in HEAD_REJECTED_STATUSES:
+                            return
+                except Exception:
+                    pass
+            status = await self._probe(session, link, slot)
+            # 405 / 501、または GET なら成功するホストは HEAD に対応していないと見なす
+            if (head_status in HEAD_UNSUPPORTED_STATUSES
+                    or (head_status is not None and not self._is_broken_status(status))):
+                self._get_only_hosts.add(host)
+
+        self._checking.add(key)
+        try:
+            await self._wait_for_consumer()
+            _, status, error, attempts, latency = await self._request(link, send)
+        finally:
+            self._checking.discard(key)
+        is_broken = error is not None or self._is_broken_status(status)
+        # キャッシュ保存
+        self._cache_verdict(key, status, error, is_broken, attempts, latency)
+        self._record(source, link, *self._link_cache[key])
+        for waiting_source, target in self._waiting.pop(key, ()):
+            self._record(waiting_source, target, *self._link_cache[key])
+
+    async def _probe(self, session: aiohttp.ClientSession, url: str, slot: Slot) -> int:
+        """
+        本文をダウンロードせずに GET のステータスを得る。
+        先頭1バイトだけを Range で要求し、Range を無視して本文全体を返すサーバーでは
+        ヘッダを受け取った時点で接続を閉じる。
+        """
+        async with session.get(url, allow_redirects=True, headers=PROBE_HEADERS) as resp:
+            status = resp.status
+            # 部分応答（416 は空のリソース）はリソースが存在することを示す
+            if status in (206, 416):
+                status = 200
+            slot.response(status, resp.headers.get("Retry-After"))
+            if resp.status == 206 and (resp.content_length or 0) <= CHUNK_SIZE:
+                # 接続を再利用できるよう残りを読み切る
+                await resp.read()
+            else:
+                resp.close()
+        return status
+
+    def _is_broken_status(self, status: Optional[int]) -> bool:
+        # broken 判定
+        return status is not None and (status >= 400 or status in self.config.error_codes)
+
+    def _record(self, source: str, target: str, status: Optional[int],
+                error: Optional[str], is_broken: bool, attempts: int = 0,
+                latency: Optional[float] = None):
+        """
+        リンクチェック結果を記録し、進捗を通知する。
+        """
         result = LinkResult(
             source=source,
-            target=link,
+            target=target,
             status=status,
             error=error,
             is_broken=is_broken,
+            attempts=attempts,
+            latency=latency,
         )
-        self._results.append(result)
+        self._results.add(result)
+        for sink in self.sinks:
+            sink.add(result)
         # 進捗通知
-        self._report_progress(link)
\ No newline at end of file
+        self._report_progress(target)
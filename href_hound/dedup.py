@@ -0,0 +1,167 @@
+import json
+import re
+import zlib
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Iterable, Optional
+
+# 内容の比較方法
+DEDUP_MODES = ("exact", "near")
+# 比較前に常に取り除く要素
+SCRIPT_STYLE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.I | re.S)
+# 定型部分として取り除く要素（ignore_boilerplate の場合）
+BOILERPLATE = re.compile(r"<(nav|header|footer|aside)\b.*?</\1\s*>", re.I | re.S)
+TAG = re.compile(r"<[^>]*>")
+LINK_ATTR = re.compile(r"""\b(?:href|src)\s*=\s*["']?([^"'\s>]+)""", re.I)
+# near: 単語 3-gram をこの数に 1 つの割合で選んで使う（選び方は内容だけで決まる）
+SHINGLE_SAMPLE = 4
+# リンクの抽出結果を保持するページ数（古く使われていないものから捨てる）
+MAX_LINK_SETS = 10000
+
+MASK64 = (1 << 64) - 1
+# SimHash のビットごとの集計に使う、1 バイトを 8 個のカウンタに広げた値の表
+_COUNTER_BITS = 24
+_SPREAD = [sum(1 << (i * _COUNTER_BITS) for i in range(8) if byte >> i & 1)
+           for byte in range(256)]
+_COUNTER_MASK = (1 << _COUNTER_BITS) - 1
+
+
+def _mix(value: int) -> int:
+    # splitmix64 の最終段。近い値を 64 ビット全体に散らす
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+    return value ^ (value >> 31)
+
+
+def simhash(features: Iterable[int]) -> int:
+    """
+    64 ビットの特徴量ハッシュの集合から SimHash を求める。
+    ビットごとに 1 の特徴量が過半数なら 1 にする。
+    """
+    a0 = a1 = a2 = a3 = a4 = a5 = a6 = a7 = 0
+    count = 0
+    spread = _SPREAD
+    for h in features:
+        count += 1
+        a0 += spread[h & 255]
+        a1 += spread[h >> 8 & 255]
+        a2 += spread[h >> 16 & 255]
+        a3 += spread[h >> 24 & 255]
+        a4 += spread[h >> 32 & 255]
+        a5 += spread[h >> 40 & 255]
+        a6 += spread[h >> 48 & 255]
+        a7 += spread[h >> 56]
+    half = count / 2
+    result = 0
+    for k, counters in enumerate((a0, a1, a2, a3, a4, a5, a6, a7)):
+        for i in range(8):
+            if (counters >> (i * _COUNTER_BITS)) & _COUNTER_MASK > half:
+                result |= 1 << (k * 8 + i)
+    return result
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _features(html: str) -> set[int]:
+    # リンク先の属性値はタグの部分だけから探す
+    tags = " ".join(TAG.findall(html))
+    features = {_mix(zlib.crc32(link.encode("utf-8", "replace")) | 1 << 32)
+                for link in set(LINK_ATTR.findall(tags))}
+    # 語は空白で区切る（句読点が付いた語は別の語になるが、同じ内容なら同じ結果になる）
+    words = TAG.sub(" ", html).lower().split()
+    codes = {w: zlib.crc32(w.encode("utf-8", "replace")) for w in set(words)}
+    words = list(map(codes.__getitem__, words))
+    # 3 語の並び (3-gram) のうち、最後の語のハッシュで選んだ一部だけを使う
+    shingles = {(a << 32 | b) ^ c << 16 for a, b, c in zip(words, words[1:], words[2:])
+                if not c % SHINGLE_SAMPLE}
+    features.update(map(_mix, shingles))
+    # 3-gram が選ばれない短いページは語そのものを使う
+    if not shingles:
+        features.update(map(_mix, codes.values()))
+    return features
+
+
+def fingerprint(html: str, mode: str, ignore_boilerplate: bool = False) -> int:
+    """
+    ページの内容のフィンガープリント (64 ビット) を求める。
+    exact は本文のハッシュ、near は単語 3-gram とリンク先の SimHash。
+    プロセスプールから呼び出せるよう引数と戻り値は picklable にしている。
+    """
+    if ignore_boilerplate or mode == "near":
+        html = SCRIPT_STYLE.sub(" ", html)
+    if ignore_boilerplate:
+        html = BOILERPLATE.sub(" ", html)
+    if mode == "exact":
+        digest = blake2b(html.encode("utf-8", "replace"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+    return simhash(_features(html))
+
+
+class ContentIndex:
+    """
+    処理済みページの内容のフィンガープリントの索引。
+    exact は本文のハッシュが一致するページ、near は単語 3-gram とリンク先の SimHash の
+    ハミング距離が distance 以下のページを同じ内容と見なす。
+    ignore_boilerplate の場合は nav / header / footer / aside 要素を除いて比較する。
+    同じ内容のページにはリンクの抽出結果 (extract_links の戻り値) を再利用する。
+    """
+    def __init__(self, mode: str, distance: int = 3, ignore_boilerplate: bool = False):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"unknown dedup mode: {mode}")
+        self.mode = mode
+        self.distance = max(0, min(distance, 31))
+        self.ignore_boilerplate = ignore_boilerplate
+        # フィンガープリント -> 最初にその内容で処理したページのURL
+        self._originals: dict[int, str] = {}
+        # ページのURL -> 圧縮したリンクの抽出結果
+        self._links: OrderedDict[str, bytes] = OrderedDict()
+        # near: 距離 distance 以内のフィンガープリントは distance + 1 個に分けた
+        # ビット列のいずれかが一致する（鳩の巣原理）ため、分けたビット列ごとに引く
+        bands = self.distance + 1
+        width = 64 // bands
+        self._bands = [(i * width, (1 << (width if i < bands - 1 else 64 - i * width)) - 1)
+                       for i in range(bands)]
+        self._band_tables: list[dict[int, list[int]]] = [{} for _ in self._bands]
+
+    def __len__(self) -> int:
+        return len(self._originals)
+
+    def fingerprint(self, html: str) -> int:
+        return fingerprint(html, self.mode, self.ignore_boilerplate)
+
+    def find(self, fp: int) -> Optional[tuple[str, list[tuple[str, str]]]]:
+        """
+        同じ内容の処理済みページの (URL, リンクの抽出結果) を返す。
+        なければ、または抽出結果を保持していなければ None。
+        """
+        url = self._originals.get(fp)
+        if url is None and self.mode == "near":
+            match = self._find_near(fp)
+            if match is not None:
+                url = self._originals[match]
+        if url is None or url not in self._links:
+            return None
+        self._links.move_to_end(url)
+        return url, [tuple(link) for link in json.loads(zlib.decompress(self._links[url]))]
+
+    def _find_near(self, fp: int) -> Optional[int]:
+        for (shift, mask), table in zip(self._bands, self._band_tables):
+            for candidate in table.get(fp >> shift & mask, ()):
+                if hamming(fp, candidate) <= self.distance:
+                    return candidate
+        return None
+
+    def add(self, fp: int, url: str, links: list[tuple[str, str]]):
+        """
+        処理したページの内容とリンクの抽出結果を登録する。
+        """
+        if fp not in self._originals and self.mode == "near":
+            for (shift, mask), table in zip(self._bands, self._band_tables):
+                table.setdefault(fp >> shift & mask, []).append(fp)
+        self._originals[fp] = url
+        self._links[url] = zlib.compress(json.dumps(links).encode("utf-8"), 1)
+        self._links.move_to_end(url)
+        if len(self._links) > MAX_LINK_SETS:
+            self._links.popitem(last=False)
@@ -0,0 +1,196 @@
+from html.parser import HTMLParser
+from typing import Iterable
+from urllib.parse import urljoin
+
+
+# リンクとして抽出するタグと属性
+LINK_TAG_ATTRS = [("a", "href")]
+RESOURCE_TAG_ATTRS = [("img", "src"), ("link", "href"), ("script", "src")]
+
+
+def tag_attrs_for(check_resources: bool) -> list[tuple[str, str]]:
+    """
+    抽出対象の (タグ, 属性) の組を返す。
+    """
+    if check_resources:
+        return LINK_TAG_ATTRS + RESOURCE_TAG_ATTRS
+    return list(LINK_TAG_ATTRS)
+
+
+class LinkExtractor:
+    """
+    HTML からリンクを抽出するバックエンドの基底クラス。
+    """
+    def __init__(self, tag_attrs: Iterable[tuple[str, str]]):
+        self.tag_attrs = dict(tag_attrs)
+
+    def extract(self, html: str) -> list[tuple[str, str]]:
+        """
+        (属性値, タグ名) のリストを文書順に返す。属性が空の要素は含めない。
+        """
+        raise NotImplementedError
+
+
+class BeautifulSoupExtractor(LinkExtractor):
+    """
+    BeautifulSoup (html.parser、失敗時は lxml) で DOM を構築して抽出する。
+    """
+    def __init__(self, tag_attrs: Iterable[tuple[str, str]]):
+        super().__init__(tag_attrs)
+        from bs4 import BeautifulSoup
+        self._soup = BeautifulSoup
+
+    def extract(self, html: str) -> list[tuple[str, str]]:
+        try:
+            soup = self._soup(html, "html.parser", on_duplicate_attribute="ignore")
+        except Exception:
+            soup = self._soup(html, "lxml")
+        links = []
+        for elem in soup.find_all(list(self.tag_attrs)):
+            raw = elem.get(self.tag_attrs[elem.name])
+            if raw:
+                links.append((raw, elem.name))
+        return links
+
+
+class LxmlExtractor(LinkExtractor):
+    """
+    lxml の HTML パーサで抽出する。
+    """
+    def __init__(self, tag_attrs: Iterable[tuple[str, str]]):
+        super().__init__(tag_attrs)
+        import lxml.etree
+        import lxml.html
+        self._parser = lxml.html.HTMLParser(encoding="utf-8")
+        self._fromstring = lxml.html.document_fromstring
+        self._parser_error = lxml.etree.ParserError
+
+    def extract(self, html: str) -> list[tuple[str, str]]:
+        if not html.strip():
+            return []
+        try:
+            # エンコーディング宣言付きの str は受け付けないため bytes で渡す
+            doc = self._fromstring(html.encode("utf-8"), parser=self._parser)
+        except self._parser_error:
+            # コメントだけの文書など、要素が1つもない
+            return []
+        links = []
+        for elem in doc.iter(*self.tag_attrs):
+            raw = elem.get(self.tag_attrs[elem.tag])
+            if raw:
+                links.append((raw, elem.tag))
+        return links
+
+
+class SelectolaxExtractor(LinkExtractor):
+    """
+    selectolax (lexbor) で抽出する。
+    HTML5 の木構築規則に従うため、閉じていない <a> が後続の要素の中で作り直され、
+    同じリンクが複数回返ることがある（ページ内の重複はクロール側で除く）。
+    """
+    def __init__(self, tag_attrs: Iterable[tuple[str, str]]):
+        super().__init__(tag_attrs)
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+        self._selector = ",".join(list(self.tag_attrs) + ["template"])
+
+    def extract(self, html: str) -> list[tuple[str, str]]:
+        links = []
+        self._collect(html, links)
+        return links
+
+    def _collect(self, html: str, links: list[tuple[str, str]]):
+        for node in self._parser(html).css(self._selector):
+            if node.tag == "template":
+                # <template> の中身は別の文書断片になり css() では辿れないため、
+                # 直列化した中身を解析し直す（属性値の > は &gt; に直列化される）
+                markup = node.html
+                self._collect(markup[markup.index(">") + 1:-len("</template>")], links)
+                continue
+            raw = node.attributes.get(self.tag_attrs[node.tag])
+            if raw:
+                links.append((raw, node.tag))
+
+
+class _LinkTokenizer(HTMLParser):
+    def __init__(self, tag_attrs: dict[str, str]):
+        super().__init__()
+        self.tag_attrs = tag_attrs
+        self.links: list[tuple[str, str]] = []
+
+    def handle_starttag(self, tag, attrs):
+        name = self.tag_attrs.get(tag)
+        if name is None:
+            return
+        # 属性が重複した場合は最初の値を使う (HTML 仕様と同じ)
+        raw = None
+        for key, value in attrs:
+            if key == name:
+                raw = value
+                break
+        if raw:
+            self.links.append((raw, tag))
+
+    handle_startendtag = handle_starttag
+
+
+class TokenizerExtractor(LinkExtractor):
+    """
+    標準ライブラリの HTMLParser でタグを逐次走査し、木を構築せずに抽出する。
+    """
+    def extract(self, html: str) -> list[tuple[str, str]]:
+        parser = _LinkTokenizer(self.tag_attrs)
+        parser.feed(html)
+        parser.close()
+        return parser.links
+
+
+EXTRACTORS = {
+    "bs4": BeautifulSoupExtractor,
+    "lxml": LxmlExtractor,
+    "selectolax": SelectolaxExtractor,
+    "tokenizer": TokenizerExtractor,
+}
+
+
+def get_extractor(name: str, tag_attrs: Iterable[tuple[str, str]]) -> LinkExtractor:
+    """
+    名前に対応する抽出バックエンドを生成する。依存ライブラリはここで読み込む。
+    """
+    try:
+        cls = EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"unknown parser: {name}") from None
+    return cls(tag_attrs)
+
+
+# プロセスごとに生成済みの抽出バックエンド
+_extractors: dict[tuple, LinkExtractor] = {}
+
+
+def extract_links(html: str, parser: str,
+                  tag_attrs: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    HTML から (属性値, タグ名) のリストを抽出する。ページ内リンク (#...) は除く。
+    プロセスプールから呼び出せるよう引数と戻り値はすべて picklable にしている。
+    """
+    key = (parser, tuple(tag_attrs))
+    extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = _extractors[key] = get_extractor(parser, key[1])
+    return [(raw, tag) for raw, tag in extractor.extract(html) if not raw.startswith("#")]
+
+
+def resolve_links(links: list[tuple[str, str]], base_url: str) -> list[tuple[str, str]]:
+    """
+    extract_links の結果を base_url で解決し、(絶対URL, タグ名) のリストにする。
+    """
+    return [(urljoin(base_url, raw), tag) for raw, tag in links]
+
+
+def extract_urls(html: str, base_url: str, parser: str,
+                 tag_attrs: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    HTML から (絶対URL, タグ名) のリストを抽出する。ページ内リンク (#...) は除く。
+    """
+    return resolve_links(extract_links(html, parser, tag_attrs), base_url)
@@ -0,0 +1,143 @@
+import asyncio
+import tempfile
+from collections import deque
+from typing import IO, Optional
+
+
+class Frontier:
+    """
+    クロール待ちURLのキュー。
+    浅い深度から順に取り出す（幅優先）。メモリ上に保持するのは max_size 件までで、
+    あふれた分は深度ごとの一時ファイルに退避し、空きができたら読み戻す。
+    """
+    # 一時ファイルから一度に読み戻す件数
+    REFILL_BATCH = 1000
+
+    def __init__(self, max_size: int = 10000):
+        self._max_size = max(1, max_size)
+        self._levels: dict[int, deque] = {}
+        self._spills: dict[int, IO[bytes]] = {}
+        # 一時ファイルごとの (未読件数, 読み出し位置)
+        self._spill_state: dict[int, list[int]] = {}
+        self._in_memory = 0
+        self._size = 0
+        self._unfinished = 0
+        self._closed = False
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def in_memory(self) -> int:
+        return self._in_memory
+
+    @property
+    def idle(self) -> bool:
+        # 取り出したURLの処理も含めてすべて終わっている
+        return self._finished.is_set()
+
+    def put(self, url: str, depth: int):
+        if self._closed:
+            return
+        if self._in_memory < self._max_size and not self._spill_state.get(depth, [0])[0]:
+            self._levels.setdefault(depth, deque()).append(url)
+            self._in_memory += 1
+        else:
+            self._spill(url, depth)
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+
+    async def get(self) -> Optional[tuple[str, int]]:
+        """
+        次のURLと深度を返す。キューが閉じられた場合は None。
+        """
+        while not self._size:
+            if self._closed:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        if self._closed:
+            return None
+        depth = min(d for d in set(self._levels) | set(self._spill_state)
+                    if self._levels.get(d) or self._spill_state.get(d, [0])[0])
+        level = self._levels.setdefault(depth, deque())
+        if not level:
+            self._refill(depth)
+        url = level.popleft()
+        self._in_memory -= 1
+        self._size -= 1
+        if not level:
+            del self._levels[depth]
+        return url, depth
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def close(self):
+        """
+        残りのURLを破棄し、待機中の get を解放する。
+        """
+        self._closed = True
+        self._unfinished -= self._size
+        self._size = 0
+        self._in_memory = 0
+        self._levels.clear()
+        for f in self._spills.values():
+            f.close()
+        self._spills.clear()
+        self._spill_state.clear()
+        self._not_empty.set()
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._finished.set()
+
+    def snapshot(self) -> list[tuple[str, int]]:
+        """
+        キューの内容を取り出さずに (url, depth) のリストで返す。
+        """
+        items = []
+        for depth in sorted(set(self._levels) | set(self._spill_state)):
+            items.extend((url, depth) for url in self._levels.get(depth, ()))
+            if depth in self._spill_state:
+                remaining, offset = self._spill_state[depth]
+                f = self._spills[depth]
+                f.seek(offset)
+                for _ in range(remaining):
+                    items.append((f.readline().rstrip(b"\n").decode("utf-8"), depth))
+        return items
+
+    def _spill(self, url: str, depth: int):
+        f = self._spills.get(depth)
+        if f is None:
+            f = tempfile.TemporaryFile()
+            self._spills[depth] = f
+            self._spill_state[depth] = [0, 0]
+        f.seek(0, 2)
+        f.write(url.encode("utf-8") + b"\n")
+        self._spill_state[depth][0] += 1
+
+    def _refill(self, depth: int):
+        f = self._spills[depth]
+        state = self._spill_state[depth]
+        f.seek(state[1])
+        level = self._levels[depth]
+        for _ in range(min(self.REFILL_BATCH, state[0])):
+            level.append(f.readline().rstrip(b"\n").decode("utf-8"))
+        state[0] -= len(level)
+        state[1] = f.tell()
+        self._in_memory += len(level)
+        if not state[0]:
+            f.close()
+            del self._spills[depth]
+            del self._spill_state[depth]
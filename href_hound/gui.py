@@ -1,45 +1,142 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import sys
+import threading
 import webbrowser
+from typing import Optional
 
 from PyQt5 import QtCore, QtWidgets
 
+from .cache import default_cache_path
 from .config import Config
 from .crawler import LinkChecker
-from .reporter import generate_report
+from .reporter import HtmlReportWriter
+from .results import LinkResult, ResultSink
+
+# 進捗とリンク切れを画面に反映する間隔（ミリ秒）
+PROGRESS_INTERVAL_MS = 100
+# ログに残す行数（古い行から消える）
+LOG_MAX_LINES = 1000
+
+
+class ProgressBuffer(ResultSink):
+    """
+    ワーカースレッドで受け取った進捗とリンク切れを、画面に反映するまでためておく。
+    画面側は take() で前回以降の分をまとめて受け取る。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = 0
+        self._errors = 0
+        self._current = ""
+        self._rows: list[tuple[str, str, str, int]] = []
+
+    def update(self, pages: int, errors: int, current: str):
+        with self._lock:
+            self._pages = pages
+            self._errors = errors
+            self._current = current
+
+    def add(self, result: LinkResult):
+        if not result.is_broken:
+            return
+        status = result.error or str(result.status)
+        with self._lock:
+            self._rows.append((result.source, result.target, status, result.attempts))
+
+    def take(self) -> tuple[int, int, str, list[tuple[str, str, str, int]]]:
+        """
+        (ページ数, リンク切れ数, 最後にチェックしたURL, 前回以降のリンク切れ) を返す。
+        URL は前回から変わっていなければ空文字。
+        """
+        with self._lock:
+            current, self._current = self._current, ""
+            rows, self._rows = self._rows, []
+            return self._pages, self._errors, current, rows
+
+
+class BrokenLinkModel(QtCore.QAbstractTableModel):
+    """
+    リンク切れの一覧のモデル。行はタプルで保持し、表示する範囲だけビューが描画する。
+    """
+    HEADERS = ["リンク元", "リンク先", "ステータス / エラー", "リクエスト回数"]
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self._rows: list[tuple[str, str, str, int]] = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return None
+        return self._rows[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def append_rows(self, rows: list[tuple[str, str, str, int]]):
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QtCore.QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
 
 
 class LinkCheckerWorker(QtCore.QThread):
     """
     リンクチェック処理をバックグラウンド実行するワーカースレッド。
+    進捗とリンク切れはシグナルで1件ずつ送らずに buffer にためる。
+    レポートはクロール中に書き出し、中断した場合もそれまでの結果で書き終える。
     """
-    progress = QtCore.pyqtSignal(int, int, str)
     finished = QtCore.pyqtSignal()
     error = QtCore.pyqtSignal(str)
 
     def __init__(self, config: Config):
         super().__init__()
         self.config = config
+        self.buffer = ProgressBuffer()
+        # stop() で中断したか
+        self.stopped = False
+        self._checker: Optional[LinkChecker] = None
+        # キャンセル判定用イベント（開始前に stop() された場合も中断できるようここで戻す）
+        self.config.cancel_event.clear()
 
     def run(self):
-        # キャンセル判定用イベント
-        self.config.cancel_event.clear()
         try:
-            runner = LinkChecker(self.config, progress_callback=self._on_progress)
-            import asyncio
-
-            results = asyncio.run(runner.run())
-            generate_report(results, self.config.output)
+            writer = HtmlReportWriter(self.config.output)
+            try:
+                self._checker = LinkChecker(self.config, progress_callback=self.buffer.update,
+                                            sinks=[writer, self.buffer])
+                asyncio.run(self._checker.run())
+            finally:
+                writer.close()
             self.finished.emit()
         except Exception as e:
             self.error.emit(str(e))
 
-    def _on_progress(self, pages: int, errors: int, current: str):
-        self.progress.emit(pages, errors, current)
-
     def stop(self):
-        self.config.cancel_event.set()
+        """
+        クロールを中断する。実行中のリクエストを打ち切り、それまでの結果でレポートを書き出して終わる。
+        """
+        self.stopped = True
+        if self._checker is not None:
+            self._checker.cancel()
+        else:
+            self.config.cancel_event.set()
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -110,6 +207,9 @@ class MainWindow(QtWidgets.QMainWindow):
         # エラーコード
         self.le_error_codes = QtWidgets.QLineEdit()
         form.addRow("リンク切れ判定ステータスコード (カンマ区切り):", self.le_error_codes)
+        # 判定キャッシュ (CLI と共有)
+        self.cb_cache = QtWidgets.QCheckBox(f"判定キャッシュを使用 ({default_cache_path()})")
+        form.addRow("", self.cb_cache)
 
         layout.addLayout(form)
         # ボタン
@@ -128,13 +228,40 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.addWidget(self.lbl_status)
         self.te_log = QtWidgets.QPlainTextEdit()
         self.te_log.setReadOnly(True)
+        self.te_log.setMaximumBlockCount(LOG_MAX_LINES)
         layout.addWidget(self.te_log)
+        # リンク切れの一覧（クロール中に追加され、並べ替え・絞り込みができる）
+        self.le_filter = QtWidgets.QLineEdit()
+        self.le_filter.setPlaceholderText("リンク切れを絞り込み (URL・ステータス)")
+        layout.addWidget(self.le_filter)
+        self.broken_model = BrokenLinkModel(self)
+        self.broken_proxy = QtCore.QSortFilterProxyModel(self)
+        self.broken_proxy.setSourceModel(self.broken_model)
+        self.broken_proxy.setFilterKeyColumn(-1)
+        self.broken_proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.tv_broken = QtWidgets.QTableView()
+        self.tv_broken.setModel(self.broken_proxy)
+        self.tv_broken.setSortingEnabled(True)
+        self.tv_broken.sortByColumn(-1, QtCore.Qt.AscendingOrder)
+        self.tv_broken.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tv_broken.setWordWrap(False)
+        # 行の高さを内容から計算しないよう固定する
+        self.tv_broken.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        header = self.tv_broken.horizontalHeader()
+        header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
+        layout.addWidget(self.tv_broken)
+        # 進捗は一定間隔でまとめて反映する
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(PROGRESS_INTERVAL_MS)
+        self._timer.timeout.connect(self._update_progress)
 
         # シグナル接続
         self.btn_start.clicked.connect(self._on_start)
         self.btn_stop.clicked.connect(self._on_stop)
         self.btn_open.clicked.connect(self._on_open)
         self.cb_sub.stateChanged.connect(self._on_sub_toggle)
+        self.le_filter.textChanged.connect(self.broken_proxy.setFilterFixedString)
 
     def _browse_output(self):
         path, _ = QtWidgets.QFileDialog.getSaveFileName(
@@ -166,54 +293,71 @@ class MainWindow(QtWidgets.QMainWindow):
             timeout=self.sp_timeout.value(),
             concurrency=self.sp_conc.value(),
             delay=self.sp_delay.value(),
-            error_codes=[int(x) for x in self.le_error_codes.text().split(",") if x.strip()]
+            error_codes=[int(x) for x in self.le_error_codes.text().split(",") if x.strip()],
+            verdict_cache=default_cache_path() if self.cb_cache.isChecked() else "",
+            # レポートに載るのはリンク切れのみ
+            broken_only=True
         )
         self.btn_start.setEnabled(False)
         self.btn_stop.setEnabled(True)
+        self.btn_open.setEnabled(False)
         self.te_log.clear()
+        self.broken_model.clear()
         self.lbl_status.setText("Starting...")
         self._worker = LinkCheckerWorker(config)
-        self._worker.progress.connect(self._update_progress)
         self._worker.finished.connect(self._on_finished)
         self._worker.error.connect(self._on_error)
         self._worker.start()
+        self._timer.start()
 
     def _on_stop(self):
-        # User requested stop: signal worker and forcibly terminate thread
+        # User requested stop: the crawl winds down and the worker emits finished
         if self._worker:
             # Disable stop button to prevent repeated clicks
             self.btn_stop.setEnabled(False)
             self.lbl_status.setText("Stopping...")
-            # Signal cancellation to crawler
             self._worker.stop()
-            # Forcefully terminate the thread (immediate stop)
-            self._worker.terminate()
-            # Wait for thread to finish
-            self._worker.wait()
-            # Reset UI state
-            self.btn_start.setEnabled(True)
-            self.btn_open.setEnabled(False)
-            self.lbl_status.setText("Stopped")
 
     def _on_open(self):
         webbrowser.open(f"file://{self.le_output.text().strip()}")
 
-    def _update_progress(self, pages: int, errors: int, current: str):
-        self.lbl_status.setText(f"Checked pages: {pages}, errors: {errors}")
-        self.te_log.appendPlainText(f"{current}")
+    def _update_progress(self):
+        if self._worker is None:
+            return
+        pages, errors, current, rows = self._worker.buffer.take()
+        if not self._worker.stopped:
+            self.lbl_status.setText(f"Checked pages: {pages}, errors: {errors}")
+        if current:
+            self.te_log.appendPlainText(current)
+        self.broken_model.append_rows(rows)
 
     def _on_finished(self):
-        self.lbl_status.setText("Finished")
+        self._timer.stop()
+        self._update_progress()
+        if self._worker.stopped:
+            broken = self.broken_model.rowCount()
+            self.lbl_status.setText(f"Stopped (partial report: {broken} broken links)")
+        else:
+            self.lbl_status.setText("Finished")
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
         self.btn_open.setEnabled(True)
 
     def _on_error(self, msg: str):
+        self._timer.stop()
+        self._update_progress()
         self.lbl_status.setText(f"Error: {msg}")
         QtWidgets.QMessageBox.critical(self, "Error", msg)
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
 
+    def closeEvent(self, event):
+        # 実行中なら中断し、レポートを書き終えるのを待ってから閉じる
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.stop()
+            self._worker.wait()
+        super().closeEvent(event)
+
 def main():
     app = QtWidgets.QApplication(sys.argv)
     # 日本語フォントを優先設定。見つからない場合は警告
@@ -0,0 +1,106 @@
+import mmap
+import os
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+from .extractor import extract_urls
+
+# HTML として解析するファイルの拡張子
+HTML_EXTENSIONS = {".html", ".htm", ".xhtml"}
+# これ以上のサイズのファイルは mmap で読み込む（バイト）
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class SiteIndex:
+    """
+    ビルド済みの静的サイトのディレクトリを起点URLに対応づける。
+    起点URLのパス以下のURLをディレクトリ内のファイルに置き換え、
+    存在確認は起動時に作成したファイル一覧で行う。
+    """
+    def __init__(self, root: str, start_url: str):
+        self.root = os.path.abspath(root)
+        parsed = urlparse(start_url)
+        self._host = parsed.netloc
+        # LinkChecker と同じく起点URLのパス以下を対象とする
+        prefix = parsed.path
+        if not prefix.endswith("/"):
+            prefix += "/"
+        self._prefix = prefix
+        self._files: set[str] = set()
+        self._dirs: set[str] = {""}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            rel = "" if rel == "." else rel + "/"
+            self._dirs.update(rel + name for name in dirnames)
+            self._files.update(rel + name for name in filenames)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _relative(self, url: str) -> Optional[str]:
+        parsed = urlparse(url)
+        if parsed.netloc != self._host:
+            return None
+        path = parsed.path or "/"
+        if path + "/" == self._prefix:
+            path += "/"
+        if not path.startswith(self._prefix):
+            return None
+        return unquote(path[len(self._prefix):])
+
+    def contains(self, url: str) -> bool:
+        """
+        url がこのディレクトリに対応するか（存在するかどうかは問わない）。
+        """
+        return self._relative(url) is not None
+
+    def resolve(self, url: str) -> Optional[tuple[str, str]]:
+        """
+        url に対応するファイルのパスと、そのページのリンクを解決する基準URLを返す。
+        ディレクトリのURLは index.html に対応させる。ファイルがなければ None。
+        """
+        rel = self._relative(url)
+        if rel is None:
+            return None
+        if rel in self._files:
+            return os.path.join(self.root, rel), url
+        directory = rel.rstrip("/")
+        index = f"{directory}/index.html" if directory else "index.html"
+        if directory not in self._dirs or index not in self._files:
+            return None
+        parsed = urlparse(url)
+        if not parsed.path.endswith("/"):
+            # スラッシュなしのディレクトリURLはサーバーと同様にスラッシュ付きとして扱う
+            url = parsed._replace(path=parsed.path + "/").geturl()
+        return os.path.join(self.root, index), url
+
+
+def is_html_file(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in HTML_EXTENSIONS
+
+
+def read_html(path: str, max_size: int = 0) -> str:
+    """
+    HTML ファイルを読み込む。大きなファイルは mmap で読み込み、
+    max_size (> 0) を超える部分は読まない。
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        limit = min(size, max_size) if max_size > 0 else size
+        if limit == 0:
+            return ""
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[:limit]
+        else:
+            data = f.read(limit)
+    return data.decode("utf-8", errors="replace")
+
+
+def extract_file_urls(path: str, base_url: str, parser: str, tag_attrs: dict,
+                      max_size: int = 0) -> list[tuple[str, str]]:
+    """
+    ローカルの HTML ファイルからリンクを抽出する。
+    ファイルの読み込みも含めて別プロセスで実行できるよう、引数と戻り値は pickle 可能。
+    """
+    return extract_urls(read_html(path, max_size), base_url, parser, tag_attrs)
@@ -0,0 +1,344 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Union
+
+import aiohttp
+from aiohttp import web
+
+# 処理段階の所要時間ヒストグラムのバケット上限（秒）
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0, 30.0)
+# 計測する処理段階と説明
+PHASES = {
+    "host_wait": "Waiting for a per-host concurrency slot",
+    "rate_wait": "Waiting for the per-host rate limit",
+    "slot_wait": "Waiting for a global concurrency slot",
+    "connection_queue": "Waiting for a free connection in the pool",
+    "dns": "Resolving host names",
+    "connect": "Opening new connections",
+    "response": "From sending a request to receiving the response headers",
+    "body": "Downloading page bodies",
+    "parse": "Extracting links from pages",
+    "dedup": "Fingerprinting pages to find duplicate content",
+    "backoff": "Sleeping before a retry",
+    "consumer_wait": "Waiting for the stream() consumer to catch up",
+    "page": "Processing one page end to end",
+}
+# カウンタの説明
+COUNTERS = {
+    "requests": "HTTP requests sent, including retries",
+    "retries": "Requests retried after a transient failure",
+    "request_exceptions": "Requests that failed without a response",
+    "pages": "Pages fetched and parsed",
+    "pages_not_modified": "Pages answered with 304 Not Modified",
+    "pages_duplicate": "Pages whose content matched an already processed page",
+    "body_bytes": "Bytes of page bodies downloaded",
+    "links_coalesced": "Link checks that waited for an identical pending request",
+}
+# OpenMetrics の Content-Type
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# メトリクス名の接頭辞
+PREFIX = "hrefhound"
+
+# ゲージの値（ラベル付きの場合はラベル値ごとの値）
+GaugeValue = Union[float, dict[str, float]]
+
+
+class Histogram:
+    """
+    固定のバケットで値の分布を数える。分位点はバケット内を線形補間して推定する。
+    """
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: tuple = TIME_BUCKETS):
+        self.buckets = buckets
+        # 最後の要素は最大のバケットを超えた値
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": _round(self.quantile(0.5)),
+            "p90": _round(self.quantile(0.9)),
+            "p99": _round(self.quantile(0.99)),
+            "max": round(self.max, 6),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 6)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CrawlMetrics:
+    """
+    クロールの計測値。処理段階ごとの所要時間のヒストグラム、件数のカウンタ、
+    キャッシュのヒット数と、取得時に値を読むゲージ（キューの長さ、ホストごとの処理中件数など）。
+    値はイベントループのスレッドからだけ更新する。
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.counters: dict[str, int] = {}
+        # ステータスの系統（2xx など、通信エラーは error）ごとの応答数
+        self.responses: dict[str, int] = {}
+        # キャッシュ名 -> [ヒット数, ミス数]
+        self.caches: dict[str, list[int]] = {}
+        self._gauges: dict[str, tuple[str, Optional[str], Callable[[], GaugeValue]]] = {}
+        # ゲージごとの観測した最大値
+        self.peaks: dict[str, float] = {}
+
+    def observe(self, phase: str, seconds: float):
+        self.phases[phase].observe(seconds)
+
+    @contextmanager
+    def time(self, phase: str) -> Iterator[None]:
+        """
+        with ブロックの所要時間（await による待ちを含む）を phase に記録する。
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase].observe(time.perf_counter() - started)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def response(self, status: Optional[int]):
+        kind = "error" if status is None else f"{status // 100}xx"
+        self.responses[kind] = self.responses.get(kind, 0) + 1
+
+    def cache(self, name: str, hit: bool):
+        entry = self.caches.get(name)
+        if entry is None:
+            entry = self.caches[name] = [0, 0]
+        entry[0 if hit else 1] += 1
+
+    def gauge(self, name: str, help: str, func: Callable[[], GaugeValue],
+              label: Optional[str] = None):
+        """
+        取得時に func() で値を読むゲージを登録する。label を指定した場合、
+        func() はラベル値ごとの値の dict を返す。
+        """
+        self._gauges[name] = (help, label, func)
+
+    def sample(self):
+        """
+        ゲージの現在値を読み、最大値を更新する。ラベル付きのゲージは合計を使う。
+        """
+        for name, (_, _, func) in self._gauges.items():
+            value = func()
+            if isinstance(value, dict):
+                value = sum(value.values())
+            if value > self.peaks.get(name, 0):
+                self.peaks[name] = value
+
+    def finish(self):
+        self.sample()
+        self.finished = time.time()
+
+    def summary(self) -> dict:
+        """
+        JSON に保存できる形の集計結果。
+        """
+        elapsed = (self.finished or time.time()) - self.started
+        gauges = {}
+        for name, (_, _, func) in self._gauges.items():
+            gauges[name] = func()
+        return {
+            "elapsed": round(elapsed, 3),
+            "phases": {phase: h.summary() for phase, h in self.phases.items() if h.count},
+            "counters": dict(self.counters),
+            "responses": dict(self.responses),
+            "caches": {name: {"hits": hits, "misses": misses,
+                              "hit_ratio": round(hits / (hits + misses), 4)
+                              if hits + misses else None}
+                       for name, (hits, misses) in self.caches.items()},
+            "gauges": gauges,
+            "peaks": dict(self.peaks),
+        }
+
+    def openmetrics(self) -> str:
+        """
+        OpenMetrics テキスト形式で出力する。
+        """
+        lines = []
+
+        def family(name: str, kind: str, help: str, unit: Optional[str] = None):
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            if unit:
+                lines.append(f"# UNIT {PREFIX}_{name} {unit}")
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+
+        family("phase_seconds", "histogram", "Time spent in each crawl phase.", "seconds")
+        for phase, h in self.phases.items():
+            label = f'phase="{phase}"'
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{PREFIX}_phase_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_phase_seconds_bucket{{{label},le="+Inf"}} {h.count}')
+            lines.append(f"{PREFIX}_phase_seconds_count{{{label}}} {h.count}")
+            lines.append(f"{PREFIX}_phase_seconds_sum{{{label}}} {h.sum!r}")
+
+        for name in sorted(self.counters):
+            family(name, "counter", COUNTERS.get(name, name.replace("_", " ")) + ".")
+            lines.append(f"{PREFIX}_{name}_total {self.counters[name]}")
+
+        family("responses", "counter", "HTTP responses by status class.")
+        for kind in sorted(self.responses):
+            lines.append(f'{PREFIX}_responses_total{{class="{kind}"}} {self.responses[kind]}')
+
+        family("cache_lookups", "counter", "Cache lookups by cache and result.")
+        for name in sorted(self.caches):
+            hits, misses = self.caches[name]
+            lines.append(f'{PREFIX}_cache_lookups_total{{cache="{name}",result="hit"}} {hits}')
+            lines.append(f'{PREFIX}_cache_lookups_total{{cache="{name}",result="miss"}} {misses}')
+
+        for name, (help, label, func) in self._gauges.items():
+            family(name, "gauge", help)
+            value = func()
+            if label is None:
+                lines.append(f"{PREFIX}_{name} {_number(value)}")
+            else:
+                for key in sorted(value):
+                    lines.append(f'{PREFIX}_{name}{{{label}="{_escape(key)}"}} '
+                                 f"{_number(value[key])}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        DNS 解決・接続・接続待ち・応答ヘッダまでの時間を記録する aiohttp のトレース設定。
+        """
+        config = aiohttp.TraceConfig()
+
+        def timer(start_signal, end_signal, phase: str):
+            async def on_start(session, ctx, params):
+                setattr(ctx, phase, time.perf_counter())
+
+            async def on_end(session, ctx, params):
+                started = getattr(ctx, phase, None)
+                if started is not None:
+                    self.phases[phase].observe(time.perf_counter() - started)
+
+            start_signal.append(on_start)
+            end_signal.append(on_end)
+
+        timer(config.on_dns_resolvehost_start, config.on_dns_resolvehost_end, "dns")
+        timer(config.on_connection_create_start, config.on_connection_create_end, "connect")
+        timer(config.on_connection_queued_start, config.on_connection_queued_end,
+              "connection_queue")
+        timer(config.on_request_start, config.on_request_end, "response")
+
+        async def on_exception(session, ctx, params):
+            self.count("request_exceptions")
+
+        config.on_request_exception.append(on_exception)
+        return config
+
+    def write_openmetrics(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.openmetrics())
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
+
+
+async def serve_metrics(metrics: CrawlMetrics, port: int,
+                        host: str = "127.0.0.1") -> web.AppRunner:
+    """
+    /metrics (OpenMetrics) と /metrics.json を返す HTTP サーバーを起動する。
+    """
+    async def openmetrics(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.openmetrics().encode("utf-8"),
+                            headers={"Content-Type": OPENMETRICS_CONTENT_TYPE})
+
+    async def summary(request: web.Request) -> web.Response:
+        return web.json_response(metrics.summary())
+
+    app = web.Application()
+    app.router.add_get("/metrics", openmetrics)
+    app.router.add_get("/metrics.json", summary)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class Profiler:
+    """
+    cProfile と tracemalloc でクロールを計測し、path に pstats 形式のプロファイル、
+    path + ".tracemalloc.txt" にメモリ割り当ての多い箇所を書き出す。
+    解析プロセス (parse_workers) 内の処理は含まない。
+    """
+    # tracemalloc の出力に載せる行数
+    TOP_ALLOCATIONS = 50
+
+    def __init__(self, path: str):
+        self.path = path
+        self._profile = cProfile.Profile()
+        self._tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._profile.dump_stats(self.path)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._tracing:
+            tracemalloc.stop()
+        stats = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]).statistics("lineno")
+        with open(self.path + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"current {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB\n\n")
+            for stat in stats[:self.TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
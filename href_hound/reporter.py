@@ -1,20 +1,13 @@
+import csv
 import datetime
 import html
+import json
+import os
+import sqlite3
 
+from .results import LinkResult, ResultSink
 
-def generate_report(results: list, output_path: str):
-    """
-    リンクチェック結果（LinkResultのlist）をHTMLファイルとして出力。
-    """
-    broken = [r for r in results if getattr(r, "is_broken", False)]
-    grouped: dict[str, list] = {}
-    for r in broken:
-        grouped.setdefault(r.source, []).append(r)
-
-    doc = []
-    doc.append("<!DOCTYPE html><html><head>")
-    doc.append("<meta charset='utf-8'><title>Link Checker Report</title>")
-    doc.append("""<style>
+HTML_HEAD = """<style>
 body { font-family: Arial, sans-serif; }
 h2 { margin-top: 1.5em; }
 table { border-collapse: collapse; width: 100%; }
@@ -22,32 +15,283 @@ th, td { border: 1px solid #ccc; padding: 8px; text-align: left; }
 th { background-color: #eee; }
 tr:nth-child(even) { background-color: #f9f9f9; }
 .error { color: red; }
-</style>""")
-    doc.append("</head><body>")
-    doc.append("<h1>Link Checker Report</h1>")
-    doc.append(f"<p>Generated: {datetime.datetime.now().isoformat()}</p>")
-
-    if broken:
-        for source, items in grouped.items():
-            # Source page URL as clickable link
-            esc_src = html.escape(source, quote=True)
-            doc.append(f'<h2>Page: <a href="{esc_src}">{esc_src}</a></h2>')
-            doc.append("<table>")
-            doc.append("<tr><th>Broken Link</th><th>Status</th><th>Error</th></tr>")
-            for r in items:
-                tgt = html.escape(r.target)
-                status = r.status if r.status is not None else ""
-                err = html.escape(r.error) if r.error else ""
-                doc.append(
-                    f"<tr><td><a href=\"{tgt}\">{tgt}</a></td>"
-                    f"<td class=\"error\">{status}</td>"
-                    f"<td class=\"error\">{err}</td></tr>"
-                )
-            doc.append("</table>")
-    else:
-        doc.append("<p>No broken links found.</p>")
-
-    doc.append("</body></html>")
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(doc))
\ No newline at end of file
+</style>"""
+
+
+class ReportWriter(ResultSink):
+    """
+    リンクチェック結果を受け取った順にファイルへ書き出すレポートの基底クラス。
+    include_ok が False の場合、または形式がリンク切れだけを扱う場合 (broken_only)
+    はリンク切れのみ書き出す。
+    """
+    broken_only = False
+
+    def __init__(self, path: str, include_ok: bool = False):
+        self.path = path
+        self.include_ok = include_ok and not self.broken_only
+        # 行バッファリングで書き、実行中でも他のツールから読めるようにする
+        self._file = open(path, "w", encoding="utf-8", newline="", buffering=1)
+        self.begin()
+
+    def add(self, result: LinkResult):
+        if result.is_broken or self.include_ok:
+            self.write(result)
+
+    def add_duplicate(self, page: str, original: str):
+        self.write_duplicate(page, original)
+
+    def begin(self):
+        pass
+
+    def write(self, result: LinkResult):
+        raise NotImplementedError
+
+    def write_duplicate(self, page: str, original: str):
+        """
+        内容が同じページの対応を書き出す。対応を表せない形式では何もしない。
+        """
+        pass
+
+    def end(self):
+        pass
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self.end()
+        finally:
+            self._file.close()
+
+
+def _seconds(latency):
+    # 応答時間はミリ秒単位に丸めて出力する
+    return None if latency is None else round(latency, 3)
+
+
+class JsonLinesWriter(ReportWriter):
+    """
+    1行に1件の JSON オブジェクトを書き出す。
+    内容が同じページは {"page": ..., "duplicate_of": ...} の行として書き出す。
+    """
+    def write(self, result: LinkResult):
+        self._file.write(json.dumps({
+            "source": result.source,
+            "target": result.target,
+            "status": result.status,
+            "error": result.error,
+            "is_broken": result.is_broken,
+            "attempts": result.attempts,
+            "latency": _seconds(result.latency),
+        }, ensure_ascii=False) + "\n")
+
+    def write_duplicate(self, page: str, original: str):
+        self._file.write(json.dumps({"page": page, "duplicate_of": original},
+                                    ensure_ascii=False) + "\n")
+
+
+class CsvWriter(ReportWriter):
+    """
+    CSV (source, target, status, error, is_broken, attempts, latency) を書き出す。
+    """
+    def begin(self):
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(["source", "target", "status", "error", "is_broken",
+                               "attempts", "latency"])
+
+    def write(self, result: LinkResult):
+        latency = _seconds(result.latency)
+        self._writer.writerow([result.source, result.target,
+                               "" if result.status is None else result.status,
+                               result.error or "", int(result.is_broken),
+                               result.attempts, "" if latency is None else latency])
+
+
+def _attr(value: str) -> str:
+    return html.escape(value, quote=True)
+
+
+def _describe(result: LinkResult) -> str:
+    if result.error:
+        return result.error
+    return f"HTTP {result.status}"
+
+
+class JUnitXmlWriter(ReportWriter):
+    """
+    JUnit XML を書き出す。リンク元ページを classname、リンク先を name とする testcase を
+    1件ずつ追記し、リンク切れは failure とする。応答時間は time 属性に書く。
+    """
+    def begin(self):
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._file.write('<testsuites>\n<testsuite name="href-hound">\n')
+
+    def write(self, result: LinkResult):
+        self._file.write(f'<testcase classname="{_attr(result.source)}" '
+                         f'name="{_attr(result.target)}"')
+        if result.latency is not None:
+            self._file.write(f' time="{_seconds(result.latency)}"')
+        if result.is_broken:
+            msg = _attr(_describe(result))
+            self._file.write(f'>\n<failure message="{msg}" type="broken-link">'
+                             f'{msg}</failure>\n</testcase>\n')
+        else:
+            self._file.write("/>\n")
+
+    def end(self):
+        self._file.write("</testsuite>\n</testsuites>\n")
+
+
+class SarifWriter(ReportWriter):
+    """
+    SARIF 2.1.0 を書き出す。リンク切れを broken-link ルールの結果として
+    results 配列に1件ずつ追記する。
+    """
+    broken_only = True
+
+    def begin(self):
+        self._first = True
+        self._file.write(
+            '{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", '
+            '"version": "2.1.0", "runs": [{"tool": {"driver": {'
+            '"name": "href-hound", "rules": [{"id": "broken-link", '
+            '"shortDescription": {"text": "Broken link"}}]}}, "results": [\n')
+
+    def write(self, result: LinkResult):
+        entry = {
+            "ruleId": "broken-link",
+            "level": "error",
+            "message": {"text": f"Broken link to {result.target} ({_describe(result)})"},
+            "locations": [{"physicalLocation": {"artifactLocation": {"uri": result.source}}}],
+            "properties": {"target": result.target, "status": result.status,
+                           "error": result.error, "attempts": result.attempts,
+                           "latency": _seconds(result.latency)},
+        }
+        if not self._first:
+            self._file.write(",\n")
+        self._first = False
+        self._file.write(json.dumps(entry, ensure_ascii=False))
+
+    def end(self):
+        self._file.write("\n]}]}\n")
+
+
+class HtmlReportWriter(ReportWriter):
+    """
+    リンク元ページごとにまとめた HTML レポートを書き出し、内容が同じページの対応を末尾に載せる。
+    結果は一時 SQLite に退避し、終了時にページ単位で読み出して書き出すため、
+    メモリ上には結果を保持しない。
+    """
+    broken_only = True
+
+    def begin(self):
+        # 空文字のパスでディスク上の一時データベースになる
+        self._spool = sqlite3.connect("")
+        self._spool.execute("CREATE TABLE pages (id INTEGER PRIMARY KEY, url TEXT UNIQUE)")
+        self._spool.execute(
+            "CREATE TABLE links (page INTEGER, target TEXT, status INTEGER, error TEXT, "
+            "attempts INTEGER)")
+        self._spool.execute("CREATE TABLE duplicates (page TEXT, original TEXT)")
+
+    def write(self, result: LinkResult):
+        self._spool.execute("INSERT OR IGNORE INTO pages (url) VALUES (?)", (result.source,))
+        self._spool.execute(
+            "INSERT INTO links SELECT id, ?, ?, ?, ? FROM pages WHERE url = ?",
+            (result.target, result.status, result.error, result.attempts, result.source))
+
+    def write_duplicate(self, page: str, original: str):
+        self._spool.execute("INSERT INTO duplicates VALUES (?, ?)", (page, original))
+
+    def end(self):
+        f = self._file
+        f.write("<!DOCTYPE html><html><head>\n")
+        f.write("<meta charset='utf-8'><title>Link Checker Report</title>\n")
+        f.write(HTML_HEAD + "\n")
+        f.write("</head><body>\n")
+        f.write("<h1>Link Checker Report</h1>\n")
+        f.write(f"<p>Generated: {datetime.datetime.now().isoformat()}</p>\n")
+        rows = self._spool.execute(
+            "SELECT pages.url, target, status, error, attempts FROM links "
+            "JOIN pages ON pages.id = links.page ORDER BY links.page, links.rowid")
+        current = None
+        for source, target, status, error, attempts in rows:
+            if source != current:
+                if current is not None:
+                    f.write("</table>\n")
+                current = source
+                # Source page URL as clickable link
+                esc_src = html.escape(source, quote=True)
+                f.write(f'<h2>Page: <a href="{esc_src}">{esc_src}</a></h2>\n')
+                f.write("<table>\n")
+                f.write("<tr><th>Broken Link</th><th>Status</th><th>Error</th><th>Attempts</th></tr>\n")
+            tgt = html.escape(target)
+            status = status if status is not None else ""
+            err = html.escape(error) if error else ""
+            f.write(
+                f"<tr><td><a href=\"{tgt}\">{tgt}</a></td>"
+                f"<td class=\"error\">{status}</td>"
+                f"<td class=\"error\">{err}</td>"
+                f"<td>{attempts}</td></tr>\n"
+            )
+        if current is not None:
+            f.write("</table>\n")
+        else:
+            f.write("<p>No broken links found.</p>\n")
+        rows = self._spool.execute("SELECT page, original FROM duplicates ORDER BY rowid")
+        first = True
+        for page, original in rows:
+            if first:
+                first = False
+                f.write("<h2>Duplicate Pages</h2>\n")
+                f.write("<p>Links already checked on the original page are not repeated.</p>\n")
+                f.write("<table>\n<tr><th>Page</th><th>Same Content As</th></tr>\n")
+            page = html.escape(page, quote=True)
+            original = html.escape(original, quote=True)
+            f.write(f'<tr><td><a href="{page}">{page}</a></td>'
+                    f'<td><a href="{original}">{original}</a></td></tr>\n')
+        if not first:
+            f.write("</table>\n")
+        f.write("</body></html>")
+        self._spool.close()
+
+
+WRITERS = {
+    "html": HtmlReportWriter,
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+    "junit": JUnitXmlWriter,
+    "sarif": SarifWriter,
+}
+
+# 出力ファイルの拡張子から推定する形式
+EXTENSION_FORMATS = {
+    ".html": "html", ".htm": "html", ".jsonl": "jsonl", ".ndjson": "jsonl",
+    ".csv": "csv", ".xml": "junit", ".sarif": "sarif",
+}
+
+
+def format_for_path(path: str) -> str:
+    """
+    出力ファイルの拡張子からレポート形式を推定する。不明な場合は html。
+    """
+    return EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), "html")
+
+
+def create_writer(fmt: str, path: str, include_ok: bool = False) -> ReportWriter:
+    try:
+        cls = WRITERS[fmt]
+    except KeyError:
+        raise ValueError(f"unknown report format: {fmt}") from None
+    return cls(path, include_ok)
+
+
+def generate_report(results: list, output_path: str):
+    """
+    リンクチェック結果（LinkResultのlist）をHTMLファイルとして出力。
+    """
+    writer = HtmlReportWriter(output_path)
+    try:
+        for r in results:
+            writer.add(r)
+    finally:
+        writer.close()
@@ -0,0 +1,151 @@
+import asyncio
+from array import array
+from collections import deque
+from typing import Iterator, Optional
+
+
+class LinkResult:
+    """
+    リンクチェック結果を表す。
+    attempts はリクエスト回数（再試行を含む、リクエストせずに判定した場合は 0）、
+    latency は最後のリクエストの応答時間（秒）。
+    """
+    __slots__ = ("source", "target", "status", "error", "is_broken", "attempts", "latency")
+
+    def __init__(self, source: str, target: str,
+                 status: Optional[int], error: Optional[str],
+                 is_broken: bool, attempts: int = 1,
+                 latency: Optional[float] = None):
+        self.source = source
+        self.target = target
+        self.status = status
+        self.error = error
+        self.is_broken = is_broken
+        self.attempts = attempts
+        self.latency = latency
+
+
+class ResultSink:
+    """
+    リンクチェック結果を逐次受け取る出力先のインタフェース。
+    """
+    def add(self, result: LinkResult):
+        raise NotImplementedError
+
+    def add_duplicate(self, page: str, original: str):
+        """
+        内容が処理済みのページ original と同じため、リンクのチェックを省いたページを受け取る。
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class ResultStore(ResultSink):
+    """
+    リンクチェック結果を列ごとの配列で保持する。
+    URL とエラーメッセージは ID に置き換えて1回だけ保持し、
+    broken_only の場合はリンク切れ以外を件数だけ数えて捨てる。
+    """
+    def __init__(self, broken_only: bool = False):
+        self.broken_only = broken_only
+        # チェックしたリンク数（破棄した結果も含む）とリンク切れ数
+        self.total = 0
+        self.broken = 0
+        self._ids: dict[str, int] = {}
+        self._strings: list[str] = []
+        self._sources = array("l")
+        self._targets = array("l")
+        # status / error は None を -1 で表す
+        self._statuses = array("h")
+        self._errors = array("l")
+        self._flags = array("b")
+        self._attempts = array("H")
+        # latency は None を負の値で表す
+        self._latencies = array("f")
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def __iter__(self) -> Iterator[LinkResult]:
+        return self.iter_from(0)
+
+    def _intern(self, value: str) -> int:
+        ident = self._ids.get(value)
+        if ident is None:
+            ident = len(self._strings)
+            self._ids[value] = ident
+            self._strings.append(value)
+        return ident
+
+    def add(self, result: LinkResult):
+        self.total += 1
+        if result.is_broken:
+            self.broken += 1
+        elif self.broken_only:
+            return
+        self._sources.append(self._intern(result.source))
+        self._targets.append(self._intern(result.target))
+        self._statuses.append(-1 if result.status is None else result.status)
+        self._errors.append(-1 if result.error is None else self._intern(result.error))
+        self._flags.append(result.is_broken)
+        self._attempts.append(min(result.attempts, 0xFFFF))
+        self._latencies.append(-1.0 if result.latency is None else result.latency)
+
+    def iter_from(self, start: int) -> Iterator[LinkResult]:
+        """
+        start 番目以降の結果を LinkResult として順に返す。
+        """
+        strings = self._strings
+        for i in range(start, len(self._sources)):
+            status = self._statuses[i]
+            error = self._errors[i]
+            latency = self._latencies[i]
+            yield LinkResult(
+                source=strings[self._sources[i]],
+                target=strings[self._targets[i]],
+                status=None if status < 0 else status,
+                error=None if error < 0 else strings[error],
+                is_broken=bool(self._flags[i]),
+                attempts=self._attempts[i],
+                latency=None if latency < 0 else latency,
+            )
+
+
+class ResultQueue(ResultSink):
+    """
+    LinkChecker.stream() 用の結果キュー。
+    maxsize 件たまると not_full がクリアされ、クロール側はそれを待って次の処理に進む。
+    """
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = max(1, maxsize)
+        self._items: deque[LinkResult] = deque()
+        self._finished = False
+        self._not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+
+    def add(self, result: LinkResult):
+        self._items.append(result)
+        self._not_empty.set()
+        if len(self._items) >= self.maxsize:
+            self.not_full.clear()
+
+    def close(self):
+        self._finished = True
+        self._not_empty.set()
+
+    async def get(self) -> Optional[LinkResult]:
+        """
+        次の結果を返す。クロールが終了して結果が残っていなければ None。
+        """
+        while not self._items:
+            if self._finished:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        result = self._items.popleft()
+        if len(self._items) < self.maxsize:
+            self.not_full.set()
+        return result
@@ -0,0 +1,302 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Optional
+from urllib.parse import urlparse
+
+from .metrics import CrawlMetrics
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ。
+    rate 件/秒でトークンを補充し、最大 burst 件まで連続実行を許す。
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # ロックで待ち順を保ち、待機中のリクエストが一斉に動き出さないようにする
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.capacity,
+                                       self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After ヘッダ（秒数または HTTP 日付）を待ち時間（秒）に変換する。
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveLimit:
+    """
+    AIMD 方式でホストごとの同時リクエスト数を調整する。
+    平滑化した応答時間が基準（観測した最小値）の tolerance 倍以内なら上限を少しずつ上げ、
+    その DEAD_BAND 倍を超えたら少しずつ下げる（間では変えない）。
+    429 / 503 / タイムアウトでは半分に下げ、
+    Retry-After が返された場合はその間このホストへのリクエストを止める。
+    上限を上げたことは REPORT_INTERVAL 秒に1回までまとめて知らせる。
+    """
+    # 過負荷を示すステータスコード
+    OVERLOAD_STATUSES = {429, 503}
+    # Retry-After で待つ最大時間（秒）
+    MAX_RETRY_AFTER = 600.0
+    # 応答時間の指数移動平均で新しい応答に与える重み
+    SMOOTHING = 0.2
+    # 上限を下げるのは平滑化した応答時間が基準の tolerance * DEAD_BAND 倍を超えた場合
+    DEAD_BAND = 1.5
+    # 上限を上げたことを知らせる最短の間隔（秒）
+    REPORT_INTERVAL = 5.0
+
+    def __init__(self, initial: int, maximum: int, tolerance: float = 2.0):
+        self.maximum = max(1, maximum)
+        self.limit = float(min(max(1, initial), self.maximum))
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._baseline: Optional[float] = None
+        self._smoothed: Optional[float] = None
+        self._last_decrease = 0.0
+        # 最後に知らせた上限とその時刻
+        self._reported = int(self.limit)
+        self._last_report: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self.paused_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def release(self):
+        self.in_flight -= 1
+        self._changed.set()
+
+    def feedback(self, latency: float, status: Optional[int], timed_out: bool,
+                 retry_after: Optional[float]) -> Optional[str]:
+        """
+        1件の応答結果から上限を更新する。上限が変わった場合はその理由を返す。
+        """
+        now = asyncio.get_running_loop().time()
+        reason = None
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until,
+                                    now + min(retry_after, self.MAX_RETRY_AFTER))
+            reason = f"Retry-After {retry_after:g}s"
+        if timed_out or status in self.OVERLOAD_STATUSES:
+            # 同じ混雑で続けて下げすぎないよう、応答時間程度の間隔をあける
+            if now - self._last_decrease >= max(self._baseline or 0.0, 1.0):
+                self._last_decrease = now
+                return self._set(self.limit / 2, now, reason or ("timeout" if timed_out
+                                                                 else f"HTTP {status}"))
+            return reason
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # 経路の変化に追従できるよう基準はゆっくり上げる
+            self._baseline += (latency - self._baseline) * 0.01
+        # 1件ごとのばらつきで上限が上下しないよう、平滑化した応答時間で判定する
+        if self._smoothed is None:
+            self._smoothed = latency
+        else:
+            self._smoothed += (latency - self._smoothed) * self.SMOOTHING
+        threshold = self._baseline * self.tolerance
+        if self._smoothed <= threshold:
+            message = self._set(self.limit + 1 / self.limit, now, reason or "latency flat")
+        elif self._smoothed > threshold * self.DEAD_BAND:
+            message = self._set(self.limit - 1 / self.limit, now, reason or "latency rising")
+        else:
+            message = None
+        return message or reason
+
+    def _set(self, limit: float, now: float, reason: str) -> Optional[str]:
+        old = int(self.limit)
+        self.limit = min(float(self.maximum), max(1.0, limit))
+        new = int(self.limit)
+        if new < old:
+            return self._report(old, now, reason)
+        if new > old:
+            self._changed.set()
+        # 上げた分は前回知らせてから REPORT_INTERVAL 秒たった時点でまとめて知らせる
+        if new > self._reported and (self._last_report is None
+                                     or now - self._last_report >= self.REPORT_INTERVAL):
+            return self._report(self._reported, now, reason)
+        return None
+
+    def _report(self, old: int, now: float, reason: str) -> str:
+        self._reported = int(self.limit)
+        self._last_report = now
+        return f"{old} -> {self._reported} ({reason})"
+
+
+class Slot:
+    """
+    確保したリクエスト枠。応答ヘッダを受け取ったら response() で結果を知らせる。
+    最初に response() が呼ばれた時刻を応答時間の計測に使い、本文の受信時間は含めない。
+    """
+    __slots__ = ("status", "retry_after", "responded")
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        # 最初の応答ヘッダを受け取った時刻 (time.monotonic)
+        self.responded: Optional[float] = None
+
+    def response(self, status: int, retry_after: Optional[str] = None):
+        if self.responded is None:
+            self.responded = time.monotonic()
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+
+class _HostState:
+    def __init__(self, max_per_host: int, rate: float, burst: int,
+                 adaptive: Optional[AdaptiveLimit]):
+        self.adaptive = adaptive
+        self.semaphore = (asyncio.Semaphore(max_per_host)
+                          if max_per_host > 0 and adaptive is None else None)
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        # 枠を確保してリクエスト中の件数
+        self.in_flight = 0
+
+
+class HostScheduler:
+    """
+    リクエストの実行枠を管理する。
+    全体の同時リクエスト数に加えて、ホストごとの同時リクエスト数と
+    リクエストレートを制限する。adaptive の場合、ホストごとの同時リクエスト数は
+    応答時間とエラーから自動調整し、変更のたびに on_adjust(host, message) を呼ぶ。
+    metrics を指定した場合は、それぞれの制限で待った時間を記録する。
+    """
+    def __init__(self, concurrency: int, max_per_host: int = 0,
+                 rate: float = 0.0, burst: int = 1, adaptive: bool = False,
+                 on_adjust: Optional[Callable[[str, str], None]] = None,
+                 metrics: Optional[CrawlMetrics] = None):
+        self._global = asyncio.Semaphore(max(1, concurrency))
+        self._concurrency = max(1, concurrency)
+        self._max_per_host = max_per_host
+        self._rate = rate
+        self._burst = burst
+        self._adaptive = adaptive
+        self._on_adjust = on_adjust
+        self._metrics = metrics
+        self._hosts: dict[str, _HostState] = {}
+
+    def _host(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            adaptive = None
+            if self._adaptive:
+                maximum = self._max_per_host if self._max_per_host > 0 else self._concurrency
+                adaptive = AdaptiveLimit(min(2, maximum), maximum)
+            state = _HostState(self._max_per_host, self._rate, self._burst, adaptive)
+            self._hosts[host] = state
+        return state
+
+    def limit_rate(self, host: str, rate: float):
+        """
+        host へのリクエストレートを rate（件/秒）以下にする（robots.txt の Crawl-delay など）。
+        既により低いレート上限がある場合はそのまま。
+        """
+        state = self._host(host)
+        if state.bucket is None or state.bucket.rate > rate:
+            state.bucket = TokenBucket(rate, 1)
+
+    def limits(self) -> dict[str, int]:
+        """
+        adaptive の場合の、ホストごとの現在の同時リクエスト数上限。
+        """
+        return {host: int(state.adaptive.limit)
+                for host, state in self._hosts.items() if state.adaptive is not None}
+
+    def in_flight(self) -> dict[str, int]:
+        """
+        ホストごとの、枠を確保してリクエスト中の件数（0 件のホストは含まない）。
+        """
+        return {host: state.in_flight for host, state in self._hosts.items() if state.in_flight}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[Slot]:
+        """
+        url のホストに対するリクエスト枠を確保する。
+        ホスト単位の待ちを先に済ませ、混雑したホストが全体の枠を占有しないようにする。
+        """
+        host = urlparse(url).netloc
+        state = self._host(host)
+        metrics = self._metrics
+        waited = time.perf_counter()
+        if state.adaptive is not None:
+            await state.adaptive.acquire()
+        elif state.semaphore is not None:
+            await state.semaphore.acquire()
+        if metrics is not None and (state.adaptive or state.semaphore) is not None:
+            metrics.observe("host_wait", time.perf_counter() - waited)
+        slot = Slot()
+        timed_out = False
+        started = None
+        try:
+            if state.bucket is not None:
+                waited = time.perf_counter()
+                await state.bucket.acquire()
+                if metrics is not None:
+                    metrics.observe("rate_wait", time.perf_counter() - waited)
+            waited = time.perf_counter()
+            async with self._global:
+                if metrics is not None:
+                    metrics.observe("slot_wait", time.perf_counter() - waited)
+                started = time.monotonic()
+                state.in_flight += 1
+                try:
+                    yield slot
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    raise
+                finally:
+                    state.in_flight -= 1
+        finally:
+            if state.adaptive is not None:
+                state.adaptive.release()
+                if started is not None and (slot.status is not None or timed_out):
+                    # 応答ヘッダまでの時間（受け取る前にタイムアウトした場合はそこまでの時間）
+                    latency = (slot.responded or time.monotonic()) - started
+                    message = state.adaptive.feedback(
+                        latency, slot.status, timed_out, slot.retry_after)
+                    if message and self._on_adjust is not None:
+                        self._on_adjust(host, message)
+            elif state.semaphore is not None:
+                state.semaphore.release()
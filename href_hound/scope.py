@@ -0,0 +1,113 @@
+import fnmatch
+import re
+from functools import lru_cache
+from typing import Optional, Pattern
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+# RFC 3986 付録 B の分解規則。urlparse と同じく netloc と path を取り出す
+URL_PARTS = re.compile(r"(?:[^:/?#]+:)?(?://([^/?#]*))?([^?#]*)")
+
+
+def _trie_regex(words: list[str]) -> str:
+    """
+    文字列のリストを、共通の接頭辞をまとめた正規表現にする。
+    単純な選択 (a|b|...) と違い、照合位置ごとに全パターンを試さずに済む。
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        # 部分文字列の照合なので、短いパターンで終わる節点より先（長いパターン）は不要
+        if "" in node:
+            return ""
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+def compile_patterns(patterns: list[str]) -> Optional[Pattern]:
+    """
+    URLパターンのリストを1つの正規表現にまとめる。
+    "re:" で始まるものは正規表現、"glob:" で始まるものは URL 全体に対する
+    ワイルドカード、それ以外は部分文字列として扱う。空のリストは None。
+    """
+    parts = []
+    literals = []
+    for pattern in patterns:
+        if pattern.startswith("re:"):
+            parts.append(pattern[3:])
+        elif pattern.startswith("glob:"):
+            parts.append("^" + fnmatch.translate(pattern[5:]))
+        elif pattern:
+            literals.append(pattern)
+        else:
+            # 空文字は以前と同じくすべてのURLに一致する
+            parts.append("")
+    if literals:
+        parts.append(_trie_regex(literals))
+    if not parts:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in parts))
+
+
+class ScopeFilter:
+    """
+    クロール範囲の判定器。設定から一度だけ構築する。
+    ホストとパスプレフィックスは1回の正規表現マッチで取り出して比較し、
+    除外・包含パターンはそれぞれ1つの正規表現にまとめて照合する。
+    判定結果は URL ごとに件数上限付きの LRU に保持する。
+    """
+    def __init__(self, start_url: str, same_origin: bool = True,
+                 include_subdomains: bool = False, exclude: Optional[list[str]] = None,
+                 include: Optional[list[str]] = None, cache_size: int = 100000):
+        parsed = urlparse(start_url)
+        self._host = parsed.netloc
+        self._subdomain_suffix = "." + parsed.netloc
+        # サブディレクトリ制限: 起点URLパス以下を対象
+        prefix = parsed.path
+        if not prefix.endswith("/"):
+            prefix += "/"
+        self.prefix = prefix
+        self._same_origin = same_origin
+        self._include_subdomains = include_subdomains
+        self._exclude = compile_patterns(exclude or [])
+        self._include = compile_patterns(include or [])
+        self._robots: Optional[RobotFileParser] = None
+        self._user_agent = ""
+        self.allowed = lru_cache(maxsize=cache_size)(self._allowed)
+
+    def set_robots(self, robots: RobotFileParser, user_agent: str):
+        """
+        起点ホストの robots.txt で Disallow されたURLを範囲外にする。
+        """
+        self._robots = robots
+        self._user_agent = user_agent
+        self.allowed.cache_clear()
+
+    def _allowed(self, url: str) -> bool:
+        netloc, path = URL_PARTS.match(url).groups()
+        netloc = netloc or ""
+        if self._include_subdomains:
+            if not (netloc == self._host or netloc.endswith(self._subdomain_suffix)):
+                return False
+        elif self._same_origin:
+            if netloc != self._host:
+                return False
+        if not path.startswith(self.prefix):
+            return False
+        if self._exclude is not None and self._exclude.search(url):
+            return False
+        if self._include is not None and not self._include.search(url):
+            return False
+        if (self._robots is not None and netloc == self._host
+                and not self._robots.can_fetch(self._user_agent, url)):
+            return False
+        return True
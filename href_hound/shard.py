@@ -0,0 +1,569 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import queue
+import struct
+import threading
+from bisect import bisect
+from dataclasses import fields
+from hashlib import blake2b
+from typing import Callable, Optional
+
+import aiohttp
+
+from .config import Config
+from .crawler import LinkChecker
+from .frontier import Frontier
+from .results import LinkResult, ResultSink, ResultStore
+
+# 1シャードあたりの仮想ノード数（シャードごとの担当URL数の偏りを抑える）
+VIRTUAL_NODES = 64
+# 転送待ちのリンクと結果を送る間隔（秒）と、間隔を待たずに送る件数
+FLUSH_INTERVAL = 0.05
+FLUSH_BATCH = 500
+# multiprocessing のキューを読むスレッドが接続の切断を確認する間隔（秒）
+QUEUE_POLL_INTERVAL = 0.2
+# 終了を指示してからワーカーの最後の結果を待つ時間（秒）
+STOP_TIMEOUT = 60.0
+# ワーカーが調整役への接続を試み続ける時間（秒）
+CONNECT_TIMEOUT = 60.0
+# シャードごとのファイルに分ける設定（同じファイルを複数のプロセスで書かないようにする）
+PER_SHARD_FILES = ("incremental_db", "verdict_cache", "metrics_file", "profile")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ShardRing:
+    """
+    正規化したURLをシャード番号に対応づけるコンシステントハッシュ。
+    シャード数を変えても、大半のURLは同じシャードの担当のまま変わらない。
+    """
+    def __init__(self, shards: int, virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted((_hash(f"shard-{shard}-{node}"), shard)
+                        for shard in range(max(1, shards)) for node in range(virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def owner(self, key: str) -> int:
+        i = bisect(self._points, _hash(key))
+        return self._shards[i % len(self._points)]
+
+
+def config_to_dict(config: Config) -> dict:
+    """
+    Config をワーカーに送れる dict にする（中断フラグは除く）。
+    """
+    return {f.name: getattr(config, f.name) for f in fields(config) if f.name != "cancel_event"}
+
+
+class Channel:
+    """
+    調整役とワーカーの間のメッセージ路のインタフェース。
+    メッセージは JSON に変換できるリストで、送った順に届く。
+    """
+    def send(self, message: list):
+        raise NotImplementedError
+
+    async def recv(self) -> Optional[list]:
+        """
+        次のメッセージを返す。相手が切断した場合は None。
+        """
+        raise NotImplementedError
+
+    async def drain(self):
+        """
+        送信バッファがたまっていれば送り終わるまで待つ。
+        """
+
+    async def close(self):
+        pass
+
+
+class QueueChannel(Channel):
+    """
+    multiprocessing のキューによるメッセージ路。alive() が False を返したら切断と見なす。
+    """
+    def __init__(self, outgoing, incoming, alive: Optional[Callable[[], bool]] = None):
+        self._outgoing = outgoing
+        self._incoming = incoming
+        self._alive = alive
+        self._closed = False
+
+    def send(self, message: list):
+        self._outgoing.put(message)
+
+    async def recv(self) -> Optional[list]:
+        while not self._closed:
+            try:
+                return await asyncio.to_thread(self._incoming.get, True, QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                if self._alive is not None and not self._alive():
+                    return None
+        return None
+
+    async def close(self):
+        self._closed = True
+
+
+class SocketChannel(Channel):
+    """
+    TCP 接続によるメッセージ路。メッセージは長さ（4 バイト）付きの JSON で送る。
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+
+    def send(self, message: list):
+        if self._writer.is_closing():
+            return
+        data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self._writer.write(struct.pack("!I", len(data)) + data)
+
+    async def recv(self) -> Optional[list]:
+        try:
+            size, = struct.unpack("!I", await self._reader.readexactly(4))
+            return json.loads(await self._reader.readexactly(size))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    async def drain(self):
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            pass
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class Transport:
+    """
+    ワーカーの起動と接続のインタフェース。
+    start() はシャード番号順に、各ワーカーとのメッセージ路を返す。
+    """
+    async def start(self, shards: int) -> list[Channel]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+def _spawn(target, *args) -> multiprocessing.Process:
+    # ワーカー内で解析用のプロセスを起動できるよう daemon にはしない
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    return process
+
+
+async def _join(processes: list[multiprocessing.Process]):
+    for process in processes:
+        await asyncio.to_thread(process.join, STOP_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+            await asyncio.to_thread(process.join)
+
+
+class LocalTransport(Transport):
+    """
+    このマシンの子プロセスでワーカーを動かし、multiprocessing のキューでやり取りする。
+    """
+    def __init__(self):
+        self._processes: list[multiprocessing.Process] = []
+
+    async def start(self, shards: int) -> list[Channel]:
+        ctx = multiprocessing.get_context("spawn")
+        channels = []
+        for _ in range(shards):
+            to_worker, from_worker = ctx.Queue(), ctx.Queue()
+            process = _spawn(_queue_worker_main, to_worker, from_worker)
+            self._processes.append(process)
+            channels.append(QueueChannel(to_worker, from_worker, process.is_alive))
+        return channels
+
+    async def close(self):
+        await _join(self._processes)
+        self._processes = []
+
+
+class SocketTransport(Transport):
+    """
+    host:port で待ち受け、TCP で接続してきたワーカーを接続順にシャードに割り当てる。
+    spawn 個（None はすべて）のワーカーはこのマシンで起動し、残りは他のマシンで
+    `python -m href_hound.shard --connect HOST:PORT` で起動したワーカーの接続を待つ。
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, spawn: Optional[int] = None,
+                 accept_timeout: Optional[float] = None,
+                 on_listen: Optional[Callable[[str, int], None]] = None):
+        self.host = host
+        self.port = port
+        self.spawn = spawn
+        self.accept_timeout = accept_timeout
+        self.on_listen = on_listen
+        self._processes: list[multiprocessing.Process] = []
+
+    async def start(self, shards: int) -> list[Channel]:
+        accepted: asyncio.Queue = asyncio.Queue()
+        server = await asyncio.start_server(
+            lambda reader, writer: accepted.put_nowait(SocketChannel(reader, writer)),
+            self.host, self.port)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            if self.on_listen is not None:
+                self.on_listen(self.host, port)
+            # 全アドレスで待ち受けている場合、このマシンのワーカーはループバックに接続する
+            connect_host = "127.0.0.1" if self.host in ("", "0.0.0.0") else self.host
+            spawn = shards if self.spawn is None else min(self.spawn, shards)
+            for _ in range(spawn):
+                self._processes.append(_spawn(_socket_worker_main, connect_host, port))
+            channels = []
+            for _ in range(shards):
+                channels.append(await asyncio.wait_for(accepted.get(), self.accept_timeout))
+            return channels
+        finally:
+            # 割り当て済みの接続は閉じずに、待ち受けだけをやめる
+            server.close()
+
+    async def close(self):
+        await _join(self._processes)
+        self._processes = []
+
+
+class _ForwardSink(ResultSink):
+    """
+    ワーカーの結果を調整役に送るまでためておく。
+    """
+    def __init__(self, flush: Callable[[], None]):
+        self.rows: list[list] = []
+        self.duplicates: list[list] = []
+        self._flush = flush
+
+    def add(self, result: LinkResult):
+        self.rows.append([result.source, result.target, result.status, result.error,
+                          result.is_broken, result.attempts, result.latency])
+        if len(self.rows) >= FLUSH_BATCH:
+            self._flush()
+
+    def add_duplicate(self, page: str, original: str):
+        self.duplicates.append([page, original])
+        if len(self.duplicates) >= FLUSH_BATCH:
+            self._flush()
+
+
+class ShardChecker(LinkChecker):
+    """
+    シャードのワーカー。担当するURLだけを取得・チェックし、担当外のリンクと
+    チェック結果は調整役に送る。担当外のリンクは調整役から担当のシャードに届く。
+    調整役から終了の指示があるまで、リンクが届くのを待ち続ける。
+    """
+    def __init__(self, config: Config, shard: int, shards: int, channel: Channel):
+        self.shard = shard
+        self._ring = ShardRing(shards)
+        self._channel = channel
+        self._outbox: list[list] = []
+        self._sink = _ForwardSink(self._flush)
+        # 調整役から受け取ったリンク数と、待機中として最後に報告した時点の値
+        self._received = 0
+        self._reported = -1
+        # 他のシャードから届いたリンクのチェック
+        self._routed: set[asyncio.Task] = set()
+        self._stop_requested = asyncio.Event()
+        super().__init__(config, sinks=[self._sink])
+
+    def _owns(self, key: str) -> bool:
+        return self._ring.owner(key) == self.shard
+
+    def _forward(self, source: str, link: str, key: str, depth: Optional[int]):
+        self._outbox.append([source, link, key, depth])
+        if len(self._outbox) >= FLUSH_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if self._outbox:
+            self._channel.send(["links", self._outbox])
+            self._outbox = []
+        if self._sink.rows:
+            self._channel.send(["results", self._count_pages, self._sink.rows])
+            self._sink.rows = []
+        if self._sink.duplicates:
+            self._channel.send(["duplicates", self._sink.duplicates])
+            self._sink.duplicates = []
+
+    async def _until_done(self, session: aiohttp.ClientSession, frontier: Frontier,
+                          seeder: Optional[asyncio.Task]):
+        """
+        届いたリンクを処理しながら、手元の処理がなくなるたびに待機中であることを報告する。
+        """
+        receiver = asyncio.create_task(self._receive(session, frontier))
+        try:
+            while not self._stop_requested.is_set():
+                self._raise_task_error()
+                self._flush()
+                await self._channel.drain()
+                idle = (frontier.idle and not self._routed
+                        and (seeder is None or seeder.done()))
+                if idle and self._received != self._reported:
+                    # 待機中の報告より前に、送るべきリンクと結果を送り終えておく
+                    self._flush()
+                    self._reported = self._received
+                    self._channel.send(["idle", self._received, self._count_pages])
+                try:
+                    await asyncio.wait_for(self._stop_requested.wait(), FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+            for task in list(self._routed):
+                task.cancel()
+            await asyncio.gather(*self._routed, return_exceptions=True)
+            self._flush()
+
+    async def _receive(self, session: aiohttp.ClientSession, frontier: Frontier):
+        while True:
+            message = await self._channel.recv()
+            if message is None:
+                # 調整役が終了した
+                self.cancel()
+                self._stop_requested.set()
+                return
+            if message[0] == "links":
+                for source, link, key, depth in message[1]:
+                    self._received += 1
+                    if depth is None:
+                        task = asyncio.create_task(self._check_link(session, source, link, key))
+                        self._routed.add(task)
+                        task.add_done_callback(self._routed.discard)
+                    else:
+                        self._enqueue_page(source, link, key, depth, frontier)
+            elif message[0] == "stop":
+                if message[1]:
+                    self.cancel()
+                self._stop_requested.set()
+                return
+
+
+async def serve_worker(channel: Channel):
+    """
+    調整役から設定を受け取り、シャードのワーカーとしてクロールする。
+    """
+    message = await channel.recv()
+    if not message or message[0] != "config":
+        return
+    _, data, shard, shards = message
+    try:
+        checker = ShardChecker(Config(**data), shard, shards, channel)
+        await checker.run()
+        channel.send(["stopped", checker.metrics.summary()])
+    except Exception as e:
+        channel.send(["error", f"shard {shard}: {e}"])
+        channel.send(["stopped", None])
+    await channel.drain()
+    await channel.close()
+
+
+def _queue_worker_main(incoming, outgoing):
+    parent = multiprocessing.parent_process()
+    channel = QueueChannel(outgoing, incoming, parent.is_alive if parent else None)
+    asyncio.run(serve_worker(channel))
+
+
+async def connect_worker(host: str, port: int, timeout: float = CONNECT_TIMEOUT):
+    """
+    調整役に接続してシャードのワーカーとして動く。調整役が起動するまで接続を試み続ける。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except OSError:
+            if loop.time() >= deadline:
+                raise
+            await asyncio.sleep(1.0)
+    await serve_worker(SocketChannel(reader, writer))
+
+
+def _socket_worker_main(host: str, port: int):
+    asyncio.run(connect_worker(host, port))
+
+
+class ShardCoordinator:
+    """
+    シャードに分けたクロールの調整役。LinkChecker と同じく run() で結果を返す。
+    URL は正規化した形のコンシステントハッシュでシャードに割り当て、各ワーカーが
+    見つけた担当外のリンクを担当のシャードに中継し、結果を sinks にまとめる。
+    すべてのワーカーが、中継したリンクを処理し終えて待機中になったら終了する。
+    """
+    def __init__(self, config: Config, shards: int, transport: Optional[Transport] = None,
+                 progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                 sinks: Optional[list[ResultSink]] = None):
+        if config.state_file:
+            raise ValueError("state files are not supported with shards")
+        self.config = config
+        self.shards = max(1, shards)
+        self.transport = transport or LocalTransport()
+        self.progress_callback = progress_callback
+        self.sinks = list(sinks or [])
+        self._ring = ShardRing(self.shards)
+        self._results = ResultStore(config.broken_only)
+        self._channels: list[Channel] = []
+        # シャードごとの、中継したリンク数と待機中の報告で受け取った処理済みリンク数
+        self._forwarded = [0] * self.shards
+        self._idle = [-1] * self.shards
+        self._pages = [0] * self.shards
+        self._summaries: list[Optional[dict]] = [None] * self.shards
+        self._errors: list[str] = []
+        self._finished: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # cancel() やワーカーのエラーによる中断要求。同じ Config を使う他の実行には影響させない
+        self._cancel = threading.Event()
+
+    async def run(self) -> list[LinkResult]:
+        self._loop = asyncio.get_running_loop()
+        self._finished = asyncio.Event()
+        channels = await self.transport.start(self.shards)
+        self._channels = channels
+        readers = [asyncio.create_task(self._read(shard, channel))
+                   for shard, channel in enumerate(channels)]
+        try:
+            for shard, channel in enumerate(channels):
+                channel.send(["config", self._shard_config(shard), shard, self.shards])
+            if self._cancelled():
+                self._finished.set()
+            await self._finished.wait()
+            for channel in channels:
+                channel.send(["stop", self._cancelled()])
+            await asyncio.wait(readers, timeout=STOP_TIMEOUT)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            for channel in channels:
+                await channel.close()
+            await self.transport.close()
+            self._loop = None
+        if self.config.metrics_json:
+            with open(self.config.metrics_json, "w", encoding="utf-8") as f:
+                json.dump({"shards": self._summaries}, f, indent=2)
+                f.write("\n")
+        if self._errors:
+            raise RuntimeError("; ".join(self._errors))
+        return list(self._results)
+
+    def cancel(self):
+        """
+        クロールを中断する。別スレッドからも呼び出せる。
+        """
+        self._cancel.set()
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._finished.set)
+
+    def _cancelled(self) -> bool:
+        return self._cancel.is_set() or self.config.cancel_event.is_set()
+
+    def _shard_config(self, shard: int) -> dict:
+        """
+        シャードのワーカーの設定。ホストごとの同時リクエスト数とレートの上限は
+        全シャードの合計が元の値になるように分け、ファイルはシャードごとに分ける。
+        """
+        data = config_to_dict(self.config)
+        data.update(output="", state_file="", resume=False, metrics_json="",
+                    broken_only=True)
+        if data["max_per_host"] > 0:
+            data["max_per_host"] = max(1, math.ceil(data["max_per_host"] / self.shards))
+        if data["rate_limit"] > 0:
+            data["rate_limit"] /= self.shards
+        elif data["delay"] > 0:
+            data["delay"] *= self.shards
+        for name in PER_SHARD_FILES:
+            if data[name]:
+                data[name] = f"{data[name]}.shard{shard}"
+        if data["metrics_port"]:
+            data["metrics_port"] += shard
+        return data
+
+    async def _read(self, shard: int, channel: Channel):
+        while True:
+            message = await channel.recv()
+            if message is None:
+                if not self._finished.is_set():
+                    self._errors.append(f"shard {shard}: connection lost")
+                    self._cancel.set()
+                    self._finished.set()
+                return
+            kind = message[0]
+            if kind == "links":
+                self._route(message[1])
+            elif kind == "results":
+                self._pages[shard] = message[1]
+                for row in message[2]:
+                    self._record(LinkResult(*row))
+            elif kind == "duplicates":
+                for page, original in message[1]:
+                    for sink in self.sinks:
+                        sink.add_duplicate(page, original)
+            elif kind == "idle":
+                self._idle[shard] = message[1]
+                self._pages[shard] = message[2]
+                if self._idle == self._forwarded:
+                    self._finished.set()
+            elif kind == "error":
+                self._errors.append(message[1])
+                self._cancel.set()
+                self._finished.set()
+            elif kind == "stopped":
+                self._summaries[shard] = message[1]
+                return
+
+    def _route(self, items: list[list]):
+        """
+        ワーカーが見つけた担当外のリンクを、担当のシャードに送る。
+        """
+        batches: dict[int, list[list]] = {}
+        for item in items:
+            batches.setdefault(self._ring.owner(item[2]), []).append(item)
+        for shard, batch in batches.items():
+            self._forwarded[shard] += len(batch)
+            self._channels[shard].send(["links", batch])
+
+    def _record(self, result: LinkResult):
+        self._results.add(result)
+        for sink in self.sinks:
+            sink.add(result)
+        if self.progress_callback:
+            self.progress_callback(sum(self._pages), self._results.broken, result.target)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="href-hound のシャードワーカー（調整役に接続してクロールを分担する）"
+    )
+    parser.add_argument(
+        "--connect",
+        required=True,
+        metavar="HOST:PORT",
+        help="調整役 (href_hound.cli --shard-listen) のアドレス"
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=CONNECT_TIMEOUT,
+        help=f"調整役への接続を試み続ける時間（秒、default: {CONNECT_TIMEOUT:g}）"
+    )
+    args = parser.parse_args()
+    host, _, port = args.connect.rpartition(":")
+    asyncio.run(connect_worker(host or "127.0.0.1", int(port), args.connect_timeout))
+
+
+if __name__ == "__main__":
+    main()
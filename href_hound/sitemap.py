@@ -0,0 +1,72 @@
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Optional
+from urllib.robotparser import RobotFileParser
+
+# gzip 圧縮されたファイルの先頭バイト
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def parse_robots(text: str) -> RobotFileParser:
+    """
+    robots.txt の内容を解析する。
+    """
+    robots = RobotFileParser()
+    robots.parse(text.splitlines())
+    return robots
+
+
+def _local_name(tag: str) -> str:
+    # 名前空間 {http://www.sitemaps.org/schemas/sitemap/0.9} を除いた要素名
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapParser:
+    """
+    sitemap.xml / サイトマップインデックスを受け取ったチャンクごとに解析する。
+    feed() はそのチャンクで読み終えた <loc> を ("url", URL) または
+    ("sitemap", サイトマップの URL) のリストで返す。
+    gzip 圧縮されたサイトマップは先頭バイトで判別して展開する。
+    解析済みの要素は順に破棄するため、大きなサイトマップでもメモリ使用量は一定。
+    """
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._decompressor = None
+        self._started = False
+        self._root: Optional[ET.Element] = None
+        self._stack: list[str] = []
+
+    def feed(self, data: bytes) -> list[tuple[str, str]]:
+        if not self._started:
+            self._started = True
+            if data.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+        self._parser.feed(data)
+        return self._events()
+
+    def close(self) -> list[tuple[str, str]]:
+        if self._decompressor is not None:
+            self._parser.feed(self._decompressor.flush())
+        self._parser.close()
+        return self._events()
+
+    def _events(self) -> list[tuple[str, str]]:
+        found = []
+        for event, elem in self._parser.read_events():
+            name = _local_name(elem.tag)
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                self._stack.append(name)
+                continue
+            self._stack.pop()
+            if name == "loc" and self._stack and elem.text:
+                parent = self._stack[-1]
+                if parent in ("url", "sitemap"):
+                    found.append((parent, elem.text.strip()))
+            elif name in ("url", "sitemap") and self._root is not None:
+                # 読み終えたエントリを木から外してメモリを解放する
+                self._root.clear()
+        return found
@@ -0,0 +1,162 @@
+import json
+import sqlite3
+from typing import Iterable, Iterator, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS visited (key TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY, status INTEGER, error TEXT, is_broken INTEGER);
+CREATE TABLE IF NOT EXISTS results (
+    source TEXT, target TEXT, status INTEGER, error TEXT, is_broken INTEGER,
+    attempts INTEGER DEFAULT 1, latency REAL);
+CREATE INDEX IF NOT EXISTS results_source ON results (source);
+CREATE TABLE IF NOT EXISTS frontier (url TEXT, depth INTEGER, in_progress INTEGER);
+CREATE TABLE IF NOT EXISTS waiting (key TEXT, source TEXT, target TEXT);
+"""
+
+
+class CrawlState:
+    """
+    クロールの途中経過を SQLite (WAL モード) に保存し、再開時に読み出す。
+    visited / verdicts / results は追記のみ、frontier / waiting は保存のたびに置き換える。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # 再試行回数と応答時間の列がない以前の状態ファイルに列を追加する
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        if "attempts" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE results ADD COLUMN attempts INTEGER DEFAULT 1")
+                self._conn.execute("ALTER TABLE results ADD COLUMN latency REAL")
+
+    def close(self):
+        self._conn.close()
+
+    def begin(self, start_url: str, resume: bool) -> bool:
+        """
+        新規クロールなら保存内容を消去する。
+        再開できる状態があれば True を返す。起点URLが異なる場合は ValueError。
+        """
+        saved = self.get_meta("start_url")
+        if resume and saved is not None:
+            if saved != start_url:
+                raise ValueError(
+                    f"state file {self.path} was created for {saved}, not {start_url}")
+            return True
+        with self._conn:
+            for table in ("meta", "visited", "verdicts", "results", "frontier", "waiting"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute("INSERT INTO meta VALUES ('start_url', ?)", (start_url,))
+        return False
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, visited: Iterable[str], verdicts: Iterable[tuple],
+             results: Iterable[tuple], frontier: Iterable[tuple],
+             waiting: Iterable[tuple], counters: dict[str, int]):
+        """
+        前回保存以降の差分と、現在のクロール待ちキュー・保留中リンク・件数を
+        1トランザクションで書き込む。
+        frontier は (url, depth, in_progress)、waiting は (key, source, target)。
+        """
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO visited VALUES (?)",
+                                   ((k,) for k in visited))
+            self._conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)",
+                                   verdicts)
+            self._conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   results)
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.executemany("INSERT INTO frontier VALUES (?, ?, ?)", frontier)
+            self._conn.execute("DELETE FROM waiting")
+            self._conn.executemany("INSERT INTO waiting VALUES (?, ?, ?)", waiting)
+            self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                   [(k, str(v)) for k, v in counters.items()])
+
+    def discard_partial_pages(self):
+        """
+        処理途中で中断したページが記録した結果を消す。再開時にそのページを処理し直す。
+        """
+        with self._conn:
+            rows = self._conn.execute(
+                "SELECT url FROM frontier WHERE in_progress = 1").fetchall()
+            self._conn.executemany("DELETE FROM results WHERE source = ?", rows)
+            self._conn.executemany("DELETE FROM waiting WHERE source = ?", rows)
+
+    def visited(self) -> Iterator[str]:
+        for (key,) in self._conn.execute("SELECT key FROM visited"):
+            yield key
+
+    def verdicts(self) -> Iterator[tuple]:
+        yield from self._conn.execute("SELECT key, status, error, is_broken FROM verdicts")
+
+    def results(self) -> Iterator[tuple]:
+        yield from self._conn.execute(
+            "SELECT source, target, status, error, is_broken, attempts, latency "
+            "FROM results")
+
+    def frontier(self) -> Iterator[tuple]:
+        yield from self._conn.execute("SELECT url, depth FROM frontier ORDER BY depth")
+
+    def waiting(self) -> Iterator[tuple]:
+        yield from self._conn.execute("SELECT key, source, target FROM waiting")
+
+
+class PageStore:
+    """
+    インクリメンタルクロール用に、ページごとの検証子 (ETag / Last-Modified) と
+    抽出したリンクを実行をまたいで保存する。書き込みはまとめてコミットする。
+    """
+    COMMIT_EVERY = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT)")
+        self._pending: list[tuple] = []
+
+    def get(self, key: str) -> Optional[tuple[Optional[str], Optional[str], list]]:
+        """
+        (ETag, Last-Modified, [(url, tag), ...]) を返す。保存されていなければ None。
+        """
+        row = self._conn.execute(
+            "SELECT etag, last_modified, links FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, links = row
+        return etag, last_modified, [tuple(link) for link in json.loads(links)]
+
+    def put(self, key: str, etag: Optional[str], last_modified: Optional[str],
+            links: list[tuple[str, str]]):
+        self._pending.append((key, etag, last_modified, json.dumps(links)))
+        if len(self._pending) >= self.COMMIT_EVERY:
+            self.flush()
+
+    def delete(self, key: str):
+        self._pending.append((key, None, None, None))
+
+    def flush(self):
+        with self._conn:
+            for key, etag, last_modified, links in self._pending:
+                if links is None:
+                    self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                else:
+                    self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                                       (key, etag, last_modified, links))
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._conn.close()
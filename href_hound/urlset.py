@@ -0,0 +1,219 @@
+import mmap
+import sys
+import tempfile
+from array import array
+from hashlib import blake2b
+from typing import Iterable, Optional
+
+# 使用率がこれを超えたら表を2倍に広げる
+MAX_LOAD = 0.7
+
+
+def fingerprint(key: str) -> int:
+    """
+    URL の 64 ビットのフィンガープリント。0 は空きスロットを表すため使わない。
+    """
+    value = int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class _Column:
+    """
+    固定長の数値配列。spill_dir を指定した場合は一時ファイルを mmap して保持し、
+    使われていない部分は OS がディスクに追い出せるようにする。
+    """
+    def __init__(self, typecode: str, length: int, spill_dir: Optional[str] = None):
+        self._file = None
+        self._mmap = None
+        if spill_dir is None:
+            self.data = array(typecode, bytes(array(typecode).itemsize * length))
+        else:
+            itemsize = array(typecode).itemsize
+            self._file = tempfile.TemporaryFile(dir=spill_dir or None)
+            self._file.truncate(itemsize * length)
+            self._mmap = mmap.mmap(self._file.fileno(), itemsize * length)
+            self.data = memoryview(self._mmap).cast(typecode)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes if self._mmap is not None else len(self.data) * self.data.itemsize
+
+    @property
+    def mapped(self) -> bool:
+        return self._mmap is not None
+
+    def close(self):
+        if self._mmap is not None:
+            self.data.release()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+
+class _FingerprintTable:
+    """
+    URL のフィンガープリントをキーとするオープンアドレス法（線形探索）のハッシュ表。
+    URL の文字列は保持しないため、1件あたりのメモリはキー 8 バイトと値の列のみ。
+    異なる URL のフィンガープリントが一致する確率は件数 n に対して約 n^2 / 2^65。
+    """
+    # 値の列の (名前, 型コード)
+    COLUMNS: tuple = ()
+
+    def __init__(self, capacity: int = 1024, spill_dir: Optional[str] = None):
+        self._spill_dir = spill_dir
+        self._size = 0
+        self._allocate(max(16, 1 << (capacity - 1).bit_length()))
+
+    def _allocate(self, capacity: int):
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._keys = _Column("Q", capacity, self._spill_dir)
+        self._columns = [_Column(code, capacity, self._spill_dir) for _, code in self.COLUMNS]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: str) -> bool:
+        fp = fingerprint(key)
+        keys = self._keys.data
+        i = fp & self._mask
+        while True:
+            slot = keys[i]
+            if slot == fp:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & self._mask
+
+    def _slot(self, fp: int) -> int:
+        """
+        fp のスロット位置を返す。未登録なら登録して位置を返す。
+        """
+        keys = self._keys.data
+        i = fp & self._mask
+        while True:
+            slot = keys[i]
+            if slot == fp:
+                return i
+            if slot == 0:
+                break
+            i = (i + 1) & self._mask
+        if (self._size + 1) > self._capacity * MAX_LOAD:
+            self._grow()
+            return self._slot(fp)
+        keys[i] = fp
+        self._size += 1
+        return i
+
+    def _grow(self):
+        old_keys = self._keys
+        old_columns = self._columns
+        self._allocate(self._capacity * 2)
+        keys = self._keys.data
+        for j, fp in enumerate(old_keys.data):
+            if fp == 0:
+                continue
+            i = fp & self._mask
+            while keys[i] != 0:
+                i = (i + 1) & self._mask
+            keys[i] = fp
+            for new, old in zip(self._columns, old_columns):
+                new.data[i] = old.data[j]
+        old_keys.close()
+        for column in old_columns:
+            column.close()
+
+    def memory_usage(self) -> dict[str, int]:
+        """
+        表の大きさ（バイト）。mapped はそのうち一時ファイルに対応づけた分。
+        """
+        columns = [self._keys] + self._columns
+        return {
+            "entries": self._size,
+            "bytes": sum(c.nbytes for c in columns),
+            "mapped": sum(c.nbytes for c in columns if c.mapped),
+        }
+
+    def close(self):
+        self._keys.close()
+        for column in self._columns:
+            column.close()
+
+
+class FingerprintSet(_FingerprintTable):
+    """
+    訪問済み URL の集合（set の代わり）。
+    """
+    def add(self, key: str):
+        self._slot(fingerprint(key))
+
+    def update(self, keys: Iterable[str]):
+        for key in keys:
+            self.add(key)
+
+
+class FingerprintDict(_FingerprintTable):
+    """
+    リンク判定のキャッシュ（dict の代わり）。
+    値 (status, error, is_broken, attempts, latency) を列ごとに保持し、
+    エラーメッセージは ID に置き換えて1回だけ保持する。
+    """
+    # status / error は None を -1、latency は None を負の値で表す
+    COLUMNS = (("status", "h"), ("error", "l"), ("is_broken", "b"),
+               ("attempts", "H"), ("latency", "f"))
+
+    def __init__(self, capacity: int = 1024, spill_dir: Optional[str] = None):
+        self._errors: list[str] = []
+        self._error_ids: dict[str, int] = {}
+        super().__init__(capacity, spill_dir)
+
+    def __setitem__(self, key: str, value: tuple):
+        status, error, is_broken, attempts, latency = value
+        i = self._slot(fingerprint(key))
+        if error is not None and error not in self._error_ids:
+            self._error_ids[error] = len(self._errors)
+            self._errors.append(error)
+        for column, item in zip(self._columns, (
+                -1 if status is None else status,
+                -1 if error is None else self._error_ids[error],
+                is_broken, min(attempts, 0xFFFF),
+                -1.0 if latency is None else latency)):
+            column.data[i] = item
+
+    def __getitem__(self, key: str) -> tuple:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        fp = fingerprint(key)
+        keys = self._keys.data
+        i = fp & self._mask
+        while True:
+            slot = keys[i]
+            if slot == fp:
+                break
+            if slot == 0:
+                return default
+            i = (i + 1) & self._mask
+        status, error, is_broken, attempts, latency = (c.data[i] for c in self._columns)
+        return (None if status < 0 else status,
+                None if error < 0 else self._errors[error],
+                bool(is_broken), attempts,
+                None if latency < 0 else latency)
+
+    def memory_usage(self) -> dict[str, int]:
+        usage = super().memory_usage()
+        usage["bytes"] += sum(sys.getsizeof(e) for e in self._errors)
+        return usage
+
+
+def container_memory(container) -> dict[str, int]:
+    """
+    set / dict で保持している場合の、キーの文字列を含めたおおよそのメモリ使用量。
+    """
+    size = sys.getsizeof(container) + sum(sys.getsizeof(key) for key in container)
+    if isinstance(container, dict):
+        size += sum(sys.getsizeof(value) for value in container.values())
+    return {"entries": len(container), "bytes": size, "mapped": 0}